@@ -0,0 +1,43 @@
+# compara os motores de reescrita do LSystem (ex1.py) numa derivação grande
+# python benchmark.py --rules "F:F[-F][+F]+[-F]" --min-len 10000000
+import argparse
+import time
+
+from ex1 import ENGINES, LSystem, parse_rules, predict_length
+
+
+def bench(lsys, iterations, engine, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lsys.generate(iterations, engine)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--axim", type=str, default="F")
+    parser.add_argument("--rules", type=str, default="F:F[-F][+F]+[-F]")
+    parser.add_argument("--min-len", type=int, default=10 ** 7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--engines", type=str, default=",".join(ENGINES))
+    args = parser.parse_args()
+
+    rules = parse_rules(args.rules)
+    # menor N cuja cadeia tem pelo menos --min-len símbolos
+    iterations = 0
+    while predict_length(args.axim, rules, iterations) < args.min_len:
+        iterations += 1
+    length = predict_length(args.axim, rules, iterations)
+    print(f"N={iterations}, {length} símbolos")
+
+    lsys = LSystem(args.axim, rules, 0, 0, 0)
+    reference = None
+    for engine in args.engines.split(","):
+        elapsed = bench(lsys, iterations, engine, args.repeat)
+        if reference is None:
+            reference = elapsed
+        print(f"{engine:>10}: {elapsed:8.3f} s  {length / elapsed / 1e6:8.1f} Msímbolos/s"
+              f"  {reference / elapsed:6.1f}x")
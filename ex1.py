@@ -1,9 +1,53 @@
 #python ex1.py --d 30 --a 120 --i 8 --l 4 --axim "FGRBO" --rules "F:F[-G][+G],G:F[-R][+R],R:F[-B][+B],B:F[-O][+O],O:F[-F][+F]"
-import turtle
 from collections import deque
 import argparse
+import hashlib
 import json
+import mmap
+import os
+import sys
+import zlib
+from itertools import islice
+from multiprocessing import Pool, Process, Queue, shared_memory
+from export import write_raster, write_svg
+from geometry import (PALETTE, BoundsCache, ShapeCache, clip, compile_commands, interpret,
+                      interpret_lattice, interpret_parallel, iter_segments, lattice_directions,
+                      lattice_segments, rows, save_segments, simplify)
+try:
+    import numpy as np
+except ImportError:  #só o motor numpy precisa
+    np = None
 Y = (0, 255, 0)
+ENGINES = ("translate", "join", "numpy")
+PARALLEL_MIN_LEN = 1 << 22  #abaixo disso o --workers reescreve no processo principal
+
+class Batch:
+    # desenho em lotes: desliga a animação (tracer(0)) e só redesenha a
+    # janela a cada `size` passos, mostrando o progresso no título. Com
+    # size 0 fica como antes (animado, turtle.speed)
+    def __init__(self, turtle, size, total, label="L-System"):
+        self.turtle = turtle
+        self.label = label
+        self.size = size
+        self.total = max(total, 1)
+        self.done = 0
+        self.next = size
+        if size:
+            turtle.tracer(0)
+            turtle.hideturtle()
+
+    def step(self):
+        self.done += 1
+        if self.done == self.next:
+            self.next += self.size
+            self.turtle.update()
+            self.turtle.title(f"{self.label} {100 * self.done // self.total}%")
+
+    def finish(self):
+        if self.size:
+            self.turtle.update()
+            self.turtle.title(self.label)
+
 class LSystem:
     def __init__(self, axiom, rules, angle, distance, largura):
         self.axiom = axiom
@@ -12,64 +56,460 @@ class LSystem:
         self.result = ""
         self.distance = distance
         self.largura = largura
+        self._lengths = []
+        self._level = None  #iteração que está em result (None = nenhum generate)
+        self.parallel_min_len = PARALLEL_MIN_LEN
+        self._shapes = ShapeCache(rules)
+        self._bounds = BoundsCache(rules)
+
+    # com o motor numpy a cadeia fica só em result_array (uint8) e result é
+    # decodificado na primeira vez que alguém pedir a string
+    @property
+    def result(self):
+        if self._result is None:
+            self._result = self.result_array.tobytes().decode("ascii")
+        return self._result
 
-    def generate(self, iterations):
-        self.result = self.axiom
+    @result.setter
+    def result(self, value):
+        self._result = value
+        self.result_array = None
+
+    def symbols(self):
+        # símbolos do último generate, lendo direto do array sem copiar
+        if self._result is None:
+            return map(chr, self.result_array.data)
+        return iter(self._result)
+
+    def generate(self, iterations, engine="translate", workers=1, cache=None):
+        # com cache, continua da iteração mais funda já guardada em disco e
+        # guarda cada iteração nova, para que um --i menor ou maior depois
+        # também encontre o seu nível
+        if cache is None:
+            self._expand(self.axiom, iterations, engine, workers)
+            self._level = iterations
+            return
+        level, start = cache.load(self.axiom, self.rules, iterations)
+        self.result = start
+        while level < iterations:
+            # com o motor numpy o nível anterior segue como array, sem decodificar
+            if engine == "numpy" and self._result is None:
+                self._expand(self.result_array, 1, engine, workers)
+            else:
+                self._expand(self.result, 1, engine, workers)
+            level += 1
+            if self._result is None:
+                cache.store(self.axiom, self.rules, level, self.result_array.data)
+            else:
+                cache.store(self.axiom, self.rules, level, self._result.encode("utf-8"))
+        self._level = iterations
+
+    def _expand(self, start, iterations, engine, workers):
+        if engine == "numpy":
+            if np is None:
+                raise ImportError("o motor numpy precisa do pacote numpy")
+            tables = numpy_tables(self.axiom, self.rules)
+            if tables is not None:
+                self._generate_numpy(start, iterations, *tables)
+                return
+            engine = "translate"
+        self.result = start
+        fast = translate_table(self.axiom, self.rules) if engine == "translate" else None
+        if fast is not None and workers > 1 and (start + "".join(self.rules.values())).isascii():
+            self.result = self._generate_parallel(start, iterations, workers, fast)
+            return
+        if fast is not None:
+            for _ in range(iterations):
+                self.result = rewrite(self.result, *fast)
+            return
         for _ in range(iterations):
             self.result = "".join(self.rules.get(ch, ch) for ch in self.result)
 
-    def draw(self, distance, largura):
+    def _generate_numpy(self, start, iterations, sizes, productions):
+        has_rule = np.zeros(256, dtype=bool)
+        for code, _ in productions:
+            has_rule[code] = True
+        if isinstance(start, np.ndarray):
+            current = start
+        else:
+            current = np.frombuffer(start.encode("ascii"), dtype=np.uint8)
+        for _ in range(iterations):
+            # tamanho da produção de cada símbolo -> posição de cada uma na
+            # saída (cumsum) -> espalha todas as ocorrências de cada regra de
+            # uma vez; os símbolos sem regra são copiados numa passada só
+            lengths = sizes[current]
+            ends = np.cumsum(lengths)
+            starts = ends - lengths
+            output = np.empty(int(ends[-1]) if len(ends) else 0, dtype=np.uint8)
+            for code, production in productions:
+                hits = starts[current == code]
+                for j, byte in enumerate(production):
+                    output[hits + j] = byte
+            plain = ~has_rule[current]
+            output[starts[plain]] = current[plain]
+            current = output
+        self._result = None
+        self.result_array = current
+
+    def _generate_parallel(self, start, iterations, workers, fast):
+        # a cadeia de cada iteração fica num bloco de memória compartilhada;
+        # cada processo reescreve um pedaço e escreve a saída direto no bloco
+        # da próxima iteração, então nenhuma cadeia passa por pickle
+        result = start
+        level = 0
+        while level < iterations and len(result) < self.parallel_min_len:
+            result = rewrite(result, *fast)
+            level += 1
+        if level == iterations:
+            return result
+        data = result.encode("ascii")
+        current = shared_memory.SharedMemory(create=True, size=len(data))
+        current.buf[:len(data)] = data
+        length = len(data)
+        try:
+            with Pool(workers, _init_worker, (self.axiom, self.rules)) as pool:
+                for _ in range(level, iterations):
+                    step = max(length // (workers * 4), 1)
+                    bounds = [(start, min(start + step, length)) for start in range(0, length, step)]
+                    # 1ª passada: tamanho da saída de cada pedaço -> deslocamentos
+                    sizes = pool.map(_chunk_length, [(current.name, a, b) for a, b in bounds])
+                    offsets = [0]
+                    for size in sizes:
+                        offsets.append(offsets[-1] + size)
+                    following = shared_memory.SharedMemory(create=True, size=max(offsets[-1], 1))
+                    try:
+                        # 2ª passada: cada pedaço reescrito no seu lugar da saída
+                        pool.map(_chunk_rewrite, [(current.name, following.name, a, b, offset)
+                                                  for (a, b), offset in zip(bounds, offsets)])
+                    except BaseException:
+                        following.close()
+                        following.unlink()
+                        raise
+                    current.close()
+                    current.unlink()
+                    current, length = following, offsets[-1]
+            return bytes(current.buf[:length]).decode("ascii")
+        finally:
+            current.close()
+            current.unlink()
+
+    def iterate(self, iterations):
+        # percorre a árvore de derivação em profundidade e devolve os símbolos
+        # da iteração N em ordem, sem montar a cadeia: a pilha guarda no máximo
+        # N + 1 iteradores (um por nível), então a memória é O(N * |produção|)
+        return self._walk([iter(self.axiom)], iterations)
+
+    def _walk(self, stack, iterations):
+        # o nível de um símbolo é a altura da pilha em que ele está
+        rules = self.rules
+        while stack:
+            for ch in stack[-1]:
+                if len(stack) <= iterations and ch in rules:
+                    stack.append(iter(rules[ch]))
+                    break
+                yield ch
+            else:
+                stack.pop()
+
+    def expansion_lengths(self, iterations):
+        # lengths[d][ch] = tamanho de ch depois de d reescritas (só para os
+        # símbolos com regra; os outros têm sempre tamanho 1)
+        lengths = self._lengths
+        if not lengths:
+            lengths.append({})
+        while len(lengths) <= iterations:
+            previous = lengths[-1]
+            lengths.append({key: sum(previous.get(ch, 1) for ch in value)
+                            for key, value in self.rules.items()})
+        return lengths
+
+    def length(self, iterations):
+        lengths = self.expansion_lengths(iterations)[iterations]
+        return sum(lengths.get(ch, 1) for ch in self.axiom)
+
+    def _seek(self, iterations, index):
+        # desce pela árvore de regras até o símbolo de posição index, pulando
+        # subárvores inteiras pelo tamanho; devolve o símbolo e a pilha de
+        # iteradores já posicionada logo depois dele (para continuar com _walk)
+        lengths = self.expansion_lengths(iterations)
+        rules = self.rules
+        depth = iterations
+        symbols = iter(self.axiom)
+        stack = [symbols]
+        while True:
+            for ch in symbols:
+                size = lengths[depth].get(ch, 1)
+                if index >= size:
+                    index -= size
+                elif depth and ch in rules:
+                    depth -= 1
+                    symbols = iter(rules[ch])
+                    stack.append(symbols)
+                    break
+                else:
+                    return ch, stack
+            else:
+                raise IndexError("índice fora da cadeia")
+
+    def symbol_at(self, iterations, index):
+        length = self.length(iterations)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("índice fora da cadeia")
+        return self._seek(iterations, index)[0]
+
+    def slice(self, iterations, start=None, stop=None):
+        # mesmo que self.result[start:stop] depois de generate(iterations)
+        start, stop, _ = slice(start, stop).indices(self.length(iterations))
+        if start >= stop:
+            return ""
+        first, stack = self._seek(iterations, start)
+        return first + "".join(islice(self._walk(stack, iterations), stop - start - 1))
+
+    def derivation(self, iterations):
+        return Derivation(self, iterations)
+
+    def segments(self, symbols=None, workers=1, iterations=None, viewport=None, resolution=None):
+        # mesma geometria do draw, mas em arrays do NumPy e sem turtle. Com
+        # iterations, monta direto da derivação reaproveitando a figura de cada
+        # (símbolo, profundidade); senão interpreta symbols ou a cadeia do
+        # generate (em trechos paralelos com workers > 1). Com viewport
+        # (x0, y0, x1, y1), só os segmentos que encostam na janela; com
+        # resolution (pixels), subárvores menores que um pixel viram um traço
+        if viewport is not None or resolution:
+            if iterations is not None:
+                segments = self._bounds.interpret(self.axiom, iterations, self.angle, self.distance,
+                                                  self.largura, viewport, resolution)
+                if segments is not None:
+                    return segments
+            segments = self.segments(symbols, workers, iterations)
+            return segments if viewport is None else clip(segments, viewport)
+        if iterations is not None and workers <= 1:
+            segments = self.instanced(iterations)
+            if segments is not None:
+                return segments
+        if symbols is None and iterations is not None and self._level != iterations:
+            # a cadeia da iteração N ainda não foi gerada: o paralelo precisa
+            # dela inteira, o serial lê os símbolos em profundidade
+            if workers > 1:
+                self.generate(iterations, workers=workers)
+            else:
+                symbols = self.iterate(iterations)
+        if symbols is None and workers > 1:
+            return interpret_parallel(self.result, self.angle, self.distance, self.largura, workers)
+        symbols = self.symbols() if symbols is None else symbols
+        # ângulo que divide 360: coordenadas exatas na rede, sem sin/cos
+        lattice = interpret_lattice(symbols, self.angle, self.largura)
+        if lattice is not None:
+            return lattice_segments(lattice, self.distance)
+        return interpret(symbols, self.angle, self.distance, self.largura)
+
+    def instanced(self, iterations, distance=None, largura=None):
+        # geometria da iteração N montada pelas figuras de cada (símbolo,
+        # profundidade) do ShapeCache, sem expandir a cadeia; None sem o NumPy
+        # ou se a derivação não der para ser montada assim
+        if np is None:
+            return None
+        return self._shapes.interpret(self.axiom, iterations, self.angle,
+                                      self.distance if distance is None else distance,
+                                      self.largura if largura is None else largura)
+
+    def replay(self, segments, batch=0):
+        # desenha geometria já calculada: só liga os pontos, trocando cor e
+        # largura quando mudam e levantando a caneta quando o segmento não
+        # começa onde o anterior terminou
+        import turtle  #o Tk só é carregado quando vai abrir a janela
+        turtle.speed(65000)
+        progress = Batch(turtle, batch, len(segments.x0))
+        position = color = width = None
+        for x0, y0, x1, y1, c, w in zip(*(column.tolist() for column in segments)):
+            if (x0, y0) != position:
+                turtle.penup()
+                turtle.setpos(x0, y0)
+                turtle.pendown()
+            if c != color:
+                color = c
+                turtle.color(PALETTE[c])
+            if w != width:
+                width = w
+                turtle.width(w)
+            turtle.setpos(x1, y1)
+            position = (x1, y1)
+            progress.step()
+        progress.finish()
+
+    def draw_progressive(self, iterations, engine="translate", batch=0):
+        # desenha os níveis 0..iterations conforme ficam prontos: um processo
+        # separado reescreve o nível k + 1 enquanto a janela mostra o nível k,
+        # então o primeiro desenho (o axioma) aparece na hora, qualquer que
+        # seja o N final. Se o desenho atrasar, pula direto para o nível mais
+        # novo já pronto
+        import turtle  #o Tk só é carregado quando vai abrir a janela
+        from queue import Empty
+        levels = Queue()
+        worker = Process(target=_pipeline_worker,
+                         args=(self.axiom, self.rules, iterations, engine, levels), daemon=True)
+        worker.start()
+        level = -1
+        while level < iterations:
+            while True:
+                try:
+                    level, symbols = levels.get(timeout=0.05)
+                    break
+                except Empty:
+                    # o próximo nível ainda não chegou: processa os eventos do
+                    # Tk para a janela continuar respondendo (mover, fechar, redesenhar)
+                    turtle.update()
+            try:
+                while level < iterations:
+                    level, symbols = levels.get_nowait()
+            except Empty:
+                pass
+            turtle.reset()
+            turtle.title(f"L-System N={level}")
+            self.draw(self.distance, self.largura, symbols, batch, f"L-System N={level}")
+        worker.join()
+
+    def draw(self, distance, largura, symbols=None, batch=0, label="L-System", iterations=None):
+        # symbols pode ser qualquer iterável de símbolos (ex: self.iterate(n));
+        # por padrão desenha self.result, ou a iteração iterations lida em
+        # profundidade se ela não for a do último generate. Os símbolos são
+        # compilados antes para opcodes (geometry.compile_commands) e cada
+        # opcode é despachado pela tabela abaixo; batch > 0 redesenha a tela a
+        # cada batch opcodes
+        if symbols is None and iterations is not None and self._level != iterations:
+            symbols = self.iterate(iterations)
+        import turtle  #o Tk só é carregado quando vai abrir a janela
         stack = deque()
         turtle.speed(65000)
         turtle.width(largura)
-        for cmd in self.result:
-            if cmd == "F":
-                #turtle.pencolor(0, 255, 0)
-                turtle.color("black")
-                turtle.forward(distance)
 
-            elif cmd == "f":
-                turtle.penup()
-                turtle.forward(distance)
-                turtle.pendown()
-            elif cmd == "+":
-                turtle.right(self.angle)
-            elif cmd == "-":
-                turtle.left(self.angle)
-            elif cmd == "[":
-                pos = turtle.pos()
-                angle = turtle.heading()
-                stack.append((pos, angle))
-            elif cmd == "]":
-                pos, angle = stack.pop()
-                turtle.penup()
-                turtle.setpos(pos)
-                turtle.setheading(angle)
-                turtle.pendown()
-            elif cmd.startswith("S"): #tamanho do galho
-                size = int(cmd[1:])
-                turtle.width(size)
-            elif cmd.startswith("G"): #cor
-                turtle.color("green")
-                turtle.forward(distance)
-            elif cmd.startswith("B"): #cor
-                turtle.color("blue")
-                turtle.forward(distance)
-            elif cmd.startswith("R"): #cor
-                turtle.color("red")
-                turtle.forward(distance)
-            elif cmd.startswith("Y"): #cor
-                turtle.color("yellow")
-                turtle.forward(distance)
-            elif cmd.startswith("O"): #cor
-                turtle.color("orange")
-                turtle.forward(distance)
+        def move(steps):
+            turtle.forward(distance * steps)
+
+        def jump(steps):
+            turtle.penup()
+            turtle.forward(distance * steps)
+            turtle.pendown()
+
+        def turn(times):
+            turtle.left(self.angle * times)
+
+        def push(_):
+            stack.append((turtle.pos(), turtle.heading()))
+
+        def pop(_):
+            pos, angle = stack.pop()
+            turtle.penup()
+            turtle.setpos(pos)
+            turtle.setheading(angle)
+            turtle.pendown()
+
+        def color(index): #cor
+            turtle.color(PALETTE[index])
+
+        handlers = (move, jump, turn, push, pop, color, turtle.width)  #na ordem dos OP_*
+        program = compile_commands(self.symbols() if symbols is None else symbols, largura)
+        progress = Batch(turtle, batch, len(program) // 2, label)
+        codes = iter(program)
+        for op, arg in zip(codes, codes):
+            handlers[op](arg)
+            progress.step()
+        progress.finish()
 
 
 
 '''
 '''
 
+def _pipeline_worker(axiom, rules, iterations, engine, levels):
+    # roda em outro processo (LSystem.draw_progressive): manda cada nível
+    # assim que termina de reescrever
+    lsys = LSystem(axiom, rules, 0, 0, 0)
+    lsys.result = axiom
+    levels.put((0, axiom))
+    for level in range(1, iterations + 1):
+        lsys._expand(lsys.result, 1, engine, 1)
+        levels.put((level, lsys.result))
+
+HASH_BASE = 257
+HASH_MOD = (1 << 61) - 1
+
+def polynomial_hash(symbols):
+    # hash polinomial de uma cadeia já montada; Derivation.digest dá o mesmo
+    # valor sem montar a cadeia
+    value = 0
+    for ch in symbols:
+        value = (value * HASH_BASE + ord(ch)) % HASH_MOD
+    return value
+
+class Derivation:
+    # iteração N como um DAG de nós (símbolo, profundidade): o nó (ch, d) tem
+    # como filhos os nós (c, d - 1) de cada c da produção de ch, então cada
+    # nó aparece uma vez só, por mais que se repita na cadeia. Guarda só o
+    # tamanho e o hash de cada nó: memória O(N * |alfabeto|)
+    def __init__(self, lsystem, iterations):
+        self.lsystem = lsystem
+        self.iterations = iterations
+        self.lengths = lsystem.expansion_lengths(iterations)
+        self._hashes = None
+
+    def node_length(self, symbol, depth):
+        return self.lengths[depth].get(symbol, 1)
+
+    def node_hash(self, symbol, depth):
+        if self._hashes is None:
+            self._hashes = self._node_hashes()
+        return self._hashes[depth].get(symbol, ord(symbol))
+
+    def _node_hashes(self):
+        # H(a + b) = H(a) * B^|b| + H(b), montado da profundidade 0 para cima
+        rules = self.lsystem.rules
+        hashes = [{}]
+        for depth in range(1, self.iterations + 1):
+            below, lengths = hashes[-1], self.lengths[depth - 1]
+            level = {}
+            for key, production in rules.items():
+                value = 0
+                for ch in production:
+                    value = (value * pow(HASH_BASE, lengths.get(ch, 1), HASH_MOD)
+                             + below.get(ch, ord(ch))) % HASH_MOD
+                level[key] = value
+            hashes.append(level)
+        return hashes
+
+    def length(self):
+        # tamanho exato para qualquer N (int do Python, sem limite)
+        return self.lsystem.length(self.iterations)
+
+    def __len__(self):
+        # len() só aceita até sys.maxsize; para N grande use length()
+        length = self.length()
+        if length > sys.maxsize:
+            raise OverflowError(f"a iteração {self.iterations} tem {length} símbolos, "
+                                f"mais do que len() suporta; use Derivation.length()")
+        return length
+
+    def __iter__(self):
+        # decodifica em profundidade, sem montar a cadeia
+        return self.lsystem.iterate(self.iterations)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("Derivation só aceita fatias com passo 1")
+            return self.lsystem.slice(self.iterations, index.start, index.stop)
+        return self.lsystem.symbol_at(self.iterations, index)
+
+    def digest(self):
+        # mesmo valor de polynomial_hash(cadeia da iteração N)
+        value = 0
+        for ch in self.lsystem.axiom:
+            value = (value * pow(HASH_BASE, self.node_length(ch, self.iterations), HASH_MOD)
+                     + self.node_hash(ch, self.iterations)) % HASH_MOD
+        return value
+
 def parse_rules(rules_str):
     rules = {}
     for rule in rules_str.split(","):
@@ -77,6 +517,187 @@ def parse_rules(rules_str):
         rules[key] = value
     return rules
 
+def translate_table(axiom, rules):
+    # str.translate com produções de vários caracteres cai num caminho lento
+    # do CPython; então cada símbolo com regra vira primeiro um marcador de um
+    # caractere (tradução 1:1, que é rápida) e depois cada marcador é trocado
+    # pela sua produção com str.replace. Devolve None quando não dá para usar
+    # o atalho (regra com chave de mais de um caractere ou marcadores demais)
+    if not all(len(key) == 1 for key in rules):
+        return None
+    used = set(axiom + "".join(rules) + "".join(rules.values()))
+    free = [chr(code) for code in range(32) if chr(code) not in used]
+    if len(free) < len(rules):
+        return None
+    markers = dict(zip(rules, free))
+    return str.maketrans(markers), [(markers[key], value) for key, value in rules.items()]
+
+def rewrite(text, table, replacements):
+    # uma iteração do motor translate, com a tabela de translate_table
+    text = text.translate(table)
+    for marker, production in replacements:
+        text = text.replace(marker, production)
+    return text
+
+# estado de cada processo do --workers: as regras e a tabela de translate_table
+_worker_tables = None
+
+def _init_worker(axiom, rules):
+    global _worker_tables
+    _worker_tables = (rules, translate_table(axiom, rules))
+
+def _read_chunk(name, start, stop):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[start:stop]).decode("ascii")
+    finally:
+        block.close()
+
+def _chunk_length(task):
+    chunk = _read_chunk(*task)
+    rules = _worker_tables[0]
+    return len(chunk) + sum(chunk.count(key) * (len(production) - 1) for key, production in rules.items())
+
+def _chunk_rewrite(task):
+    source, target, start, stop, offset = task
+    data = rewrite(_read_chunk(source, start, stop), *_worker_tables[1]).encode("ascii")
+    block = shared_memory.SharedMemory(name=target)
+    try:
+        block.buf[offset:offset + len(data)] = data
+    finally:
+        block.close()
+
+def numpy_tables(axiom, rules):
+    # tamanho da produção de cada byte (símbolos sem regra produzem a si
+    # mesmos, tamanho 1) e a produção de cada símbolo com regra como array.
+    # Devolve None se alguma regra não for ASCII de um caractere
+    if not all(len(key) == 1 for key in rules):
+        return None
+    try:
+        axiom.encode("ascii")
+        productions = [(ord(key.encode("ascii")), np.frombuffer(value.encode("ascii"), dtype=np.uint8))
+                       for key, value in rules.items()]
+    except UnicodeEncodeError:
+        return None
+    sizes = np.ones(256, dtype=np.int64)
+    for code, production in productions:
+        sizes[code] = len(production)
+    return sizes, productions
+
+class DerivationCache:
+    # cache em disco das cadeias geradas, endereçado pelo hash canônico do
+    # axioma + regras: <diretório>/<hash>/<N>.lsys (ou .lsys.z comprimido).
+    # Quando passa de max_bytes, apaga as entradas usadas há mais tempo (LRU
+    # pela data de modificação, que é atualizada a cada leitura)
+    def __init__(self, directory, max_bytes=1 << 30, compress=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+
+    def key(self, axiom, rules):
+        canonical = json.dumps([axiom, sorted(rules.items())], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _entries(self, axiom, rules):
+        # {iteração: caminho} das entradas guardadas para este sistema
+        folder = os.path.join(self.directory, self.key(axiom, rules))
+        entries = {}
+        if os.path.isdir(folder):
+            for name in os.listdir(folder):
+                level, _, extension = name.partition(".")
+                if level.isdigit() and extension in ("lsys", "lsys.z"):
+                    entries[int(level)] = os.path.join(folder, name)
+        return entries
+
+    def load(self, axiom, rules, iterations):
+        # (iteração, cadeia) da entrada mais funda <= iterations, ou (0, axioma).
+        # Entrada corrompida (zlib ou UTF-8 inválido) conta como ausente e é apagada
+        entries = self._entries(axiom, rules)
+        for level in sorted((level for level in entries if level <= iterations), reverse=True):
+            path = entries[level]
+            try:
+                text = self._read(path)
+            except (zlib.error, UnicodeDecodeError):
+                os.remove(path)
+                continue
+            os.utime(path)
+            return level, text
+        return 0, axiom
+
+    def _read(self, path):
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return ""
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if path.endswith(".z"):
+                    return zlib.decompress(mapped).decode("utf-8")
+                # decodifica direto das páginas mapeadas, sem copiar para bytes antes
+                return str(mapped, "utf-8")
+
+    def store(self, axiom, rules, iteration, data):
+        folder = os.path.join(self.directory, self.key(axiom, rules))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{iteration}.lsys" + (".z" if self.compress else ""))
+        if self.compress:
+            data = zlib.compress(data, 1)
+        # grava num temporário e troca, para nunca deixar uma entrada pela metade
+        temporary = path + f".{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        self.evict()
+
+    def evict(self):
+        files = []
+        for folder in os.scandir(self.directory):
+            if folder.is_dir():
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith((".lsys", ".lsys.z")):
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+def substitution_matrix(axiom, rules):
+    # matriz de substituição: M[i][j] = quantas vezes o símbolo j aparece na
+    # produção do símbolo i (constantes viram a identidade). Só as regras de
+    # um caractere entram, igual ao generate
+    rules = {key: value for key, value in rules.items() if len(key) == 1}
+    alphabet = []
+    for ch in axiom + "".join(rules) + "".join(rules.values()):
+        if ch not in alphabet:
+            alphabet.append(ch)
+    matrix = []
+    for ch in alphabet:
+        production = rules.get(ch, ch)
+        matrix.append([production.count(other) for other in alphabet])
+    return alphabet, matrix
+
+def _mat_mul(a, b):
+    columns = list(zip(*b))
+    return [[sum(x * y for x, y in zip(row, col)) for col in columns] for row in a]
+
+def count_symbols(axiom, rules, iterations):
+    # contagem de cada símbolo na iteração N sem expandir a cadeia:
+    # v_N = v_0 * M^N, com M^N por quadrados sucessivos (inteiros exatos)
+    alphabet, matrix = substitution_matrix(axiom, rules)
+    vector = [[axiom.count(ch) for ch in alphabet]]
+    n = iterations
+    while n:
+        if n & 1:
+            vector = _mat_mul(vector, matrix)
+        n >>= 1
+        if n:
+            matrix = _mat_mul(matrix, matrix)
+    return dict(zip(alphabet, vector[0]))
+
+def predict_length(axiom, rules, iterations):
+    return sum(count_symbols(axiom, rules, iterations).values())
+
 if __name__ == "__main__":
 
     axiom = "F"
@@ -94,19 +715,127 @@ if __name__ == "__main__":
     parser.add_argument("--axim", type=str, default="F")
     #parser.add_argument("--axiom", type=str, default="F")
     parser.add_argument("--rules", type=str, default="F:F[+F][-F]")
+    parser.add_argument("--stream", action="store_true")  #não guarda a cadeia inteira na memória
+    parser.add_argument("--dry-run", action="store_true")  #só mostra o tamanho previsto
+    parser.add_argument("--max-len", type=int, default=None)  #recusa cadeias maiores que isso
+    parser.add_argument("--engine", choices=ENGINES, default="translate")
+    parser.add_argument("--workers", type=int, default=1)  #processos para reescrever (motor translate)
+    parser.add_argument("--cache", type=str, default=None)  #diretório do cache de derivações
+    parser.add_argument("--cache-size", type=int, default=1024)  #em MB
+    parser.add_argument("--compress", action="store_true")  #comprime as entradas do cache
+    parser.add_argument("--geometry", type=str, default=None)  #salva os segmentos num .npz, sem abrir janela
+    parser.add_argument("--replay", action="store_true")  #calcula a geometria antes e o turtle só redesenha
+    parser.add_argument("--viewport", type=str, default=None)  #x0,y0,x1,y1 (negativos: --viewport=-20,-20,20,20)
+    parser.add_argument("--lod", type=int, default=None)  #resolução alvo em pixels: poda o que é menor que um pixel
+    parser.add_argument("--out", type=str, default=None)  #exporta para arquivo (.svg ou .png) sem abrir janela
+    parser.add_argument("--size", type=int, default=1024)  #maior lado do .png em pixels
+    parser.add_argument("--batch", type=int, default=0)  #sem animação, atualiza a janela a cada N passos
+    parser.add_argument("--progressive", action="store_true")  #desenha cada nível enquanto calcula o próximo
+    parser.add_argument("--simplify", action="store_true")  #tira segmentos repetidos e junta os colineares
     args = parser.parse_args()
 
     angle = args.a
     distance = args.d
     #axiom = args.axiom
-    iter = args.i
+    iterations = args.i
     largura = args.l
     #rules = args.rules
     axiom = args.axim
     rules = parse_rules(args.rules)
 
+    counts = count_symbols(axiom, rules, iterations)
+    length = sum(counts.values())
+    if args.dry_run:
+        print(f"comprimento previsto (N={iterations}): {length}")
+        for symbol, count in counts.items():
+            print(f"  {symbol}: {count}")
+        sys.exit(0)
+    if args.max_len is not None and length > args.max_len:
+        sys.exit(f"cadeia com {length} símbolos passa do limite --max-len {args.max_len}")
+
+    viewport = None
+    if args.viewport is not None:
+        viewport = tuple(float(value) for value in args.viewport.split(","))
+    # só a geometria foi pedida: monta direto da derivação (figuras e caixas
+    # por símbolo e profundidade), sem gerar nem imprimir a cadeia; o segments
+    # só expande a cadeia se a derivação não der para ser resumida
+    geometry_only = (viewport is not None or args.lod or args.geometry is not None or args.replay
+                     or args.out is not None)
+
     lsys = LSystem(axiom, rules, angle, distance, largura)
-    lsys.generate(iter)  #aqui é o N
-    print(lsys.result)
-    lsys.draw(distance, largura)
+    if args.progressive:
+        lsys.draw_progressive(iterations, args.engine, args.batch)
+        import turtle
+        turtle.done()
+        sys.exit(0)
+    if geometry_only:
+        pass
+    elif args.stream:
+        # escreve em blocos para não montar a cadeia inteira
+        symbols = lsys.iterate(iterations)
+        chunk = "".join(islice(symbols, 65536))
+        while chunk:
+            sys.stdout.write(chunk)
+            chunk = "".join(islice(symbols, 65536))
+        print()
+    else:
+        cache = None
+        if args.cache is not None:
+            cache = DerivationCache(args.cache, args.cache_size << 20, args.compress)
+        lsys.generate(iterations, args.engine, args.workers, cache)  #aqui é o N
+        if lsys.result_array is not None:
+            # escreve os bytes do array direto, sem montar a string
+            sys.stdout.flush()
+            sys.stdout.buffer.write(lsys.result_array.data)
+            print()
+        else:
+            print(lsys.result)
+
+    def geometry():
+        # segmentos para o turtle, o SVG ou o PNG, já simplificados se pedido
+        lattice = None
+        if args.simplify and viewport is None and not args.lod and lattice_directions(angle):
+            # ângulo da rede: coordenadas inteiras para comparar os segmentos sem arredondar
+            lattice = interpret_lattice(lsys.iterate(iterations), angle, largura)
+            segments = lattice_segments(lattice, distance)
+        else:
+            segments = lsys.segments(None, args.workers, iterations, viewport, args.lod)
+        if args.simplify:
+            count = len(segments.x0)
+            segments = simplify(segments, lattice=lattice)
+            removed = count - len(segments.x0)
+            print(f"simplificação: {count} -> {len(segments.x0)} segmentos "
+                  f"(-{100 * removed / max(count, 1):.1f}%)")
+        return segments
+
+    if args.geometry is not None:
+        segments = geometry()
+        save_segments(args.geometry, segments)
+        print(f"{len(segments.x0)} segmentos salvos em {args.geometry}")
+        sys.exit(0)
+    if args.out is not None and args.out.lower().endswith(".png"):
+        segments = geometry()
+        width, height = write_raster(args.out, segments, args.size, viewport=viewport,
+                                     workers=args.workers)
+        print(f"{len(segments.x0)} segmentos rasterizados em {width}x{height} salvos em {args.out}")
+        sys.exit(0)
+    if args.out is not None:
+        if viewport is not None or args.lod or args.simplify:
+            segments = rows(geometry())
+        else:
+            # direto da sequência de símbolos para o disco, sem guardar a geometria
+            segments = iter_segments(lsys.iterate(iterations), angle, distance, largura)
+        count, lines = write_svg(args.out, segments)
+        print(f"{count} segmentos em {lines} traços salvos em {args.out}")
+        sys.exit(0)
+
+    import turtle  #o Tk só é carregado quando vai abrir a janela
+    if viewport is not None:
+        # a janela do turtle passa a mostrar só o retângulo pedido
+        turtle.setworldcoordinates(*viewport)
+        lsys.replay(geometry(), args.batch)
+    elif args.lod or args.replay or args.simplify:
+        lsys.replay(geometry(), args.batch)
+    else:
+        lsys.draw(distance, largura, batch=args.batch, iterations=iterations)
     turtle.done()
@@ -1,5 +1,8 @@
-from typing import Dict, Set, List, Tuple, Callable
+from typing import Dict, Set, List, Tuple, Callable, Iterable, Iterator, Optional
+from array import array
+from collections import deque
 from dataclasses import dataclass, field
+from itertools import groupby, product
 
 @dataclass
 class Transicao:
@@ -29,6 +32,69 @@ class Transicao:
       f")"
     )
 
+class PilhaCompacta:
+  # pilha em sequências (símbolo, quantidade) guardadas em dois arrays de
+  # inteiros: empilhar o mesmo símbolo várias vezes seguidas (ex: as variáveis
+  # de uma produção FF...) só aumenta a contagem do topo, sem um objeto Python
+  # por elemento. Tem o que o Transicao.aplicar e o validar_cadeia usam de uma
+  # lista: topo com [-1], pop, append, extend, len e iteração (base -> topo)
+  def __init__(self, simbolos: Iterable[str] = ()):
+    self._ids: Dict[str, int] = {}
+    self._simbolos: List[str] = []
+    self._sequencias = array('l')
+    self._contagens = array('q')
+    self._tamanho = 0
+    self.extend(simbolos)
+
+  def append(self, simbolo: str, quantidade: int = 1):
+    codigo = self._ids.get(simbolo)
+    if codigo is None:
+      codigo = self._ids[simbolo] = len(self._simbolos)
+      self._simbolos.append(simbolo)
+    if self._sequencias and self._sequencias[-1] == codigo:
+      self._contagens[-1] += quantidade
+    else:
+      self._sequencias.append(codigo)
+      self._contagens.append(quantidade)
+    self._tamanho += quantidade
+
+  def extend(self, simbolos: Iterable[str]):
+    for simbolo, repeticoes in groupby(simbolos):
+      self.append(simbolo, sum(1 for _ in repeticoes))
+
+  def pop(self) -> str:
+    if not self._tamanho:
+      raise IndexError("pop from empty stack")
+    simbolo = self._simbolos[self._sequencias[-1]]
+    self._contagens[-1] -= 1
+    if not self._contagens[-1]:
+      self._sequencias.pop()
+      self._contagens.pop()
+    self._tamanho -= 1
+    return simbolo
+
+  def __getitem__(self, indice: int) -> str:
+    if indice != -1 or not self._tamanho:
+      raise IndexError("só o topo da pilha pode ser lido")
+    return self._simbolos[self._sequencias[-1]]
+
+  def topo(self) -> Optional[str]:
+    # o mesmo que pilha[-1] if pilha else None numa chamada só
+    return self._simbolos[self._sequencias[-1]] if self._tamanho else None
+
+  def __len__(self) -> int:
+    return self._tamanho
+
+  def __iter__(self) -> Iterator[str]:
+    for codigo, contagem in zip(self._sequencias, self._contagens):
+      simbolo = self._simbolos[codigo]
+      for _ in range(contagem):
+        yield simbolo
+
+  def sequencias(self) -> int:
+    # quantos pares (símbolo, quantidade) estão guardados
+    return len(self._sequencias)
+
 @dataclass
 class LSystem:
   alfabeto: Set[str]
@@ -38,13 +104,86 @@ class LSystem:
   def gerar_cadeia(self, iteracoes: int) -> str:
     cadeia_atual = self.axioma
     
+    livres = [chr(codigo) for codigo in range(32)
+              if chr(codigo) not in self.axioma + "".join(self.regras_producao.values())]
+    if all(len(simbolo) == 1 for simbolo in self.regras_producao) and len(livres) >= len(self.regras_producao):
+      # regras de um caractere: troca cada variável por um marcador com um
+      # str.translate 1:1 e depois cada marcador pela produção com str.replace
+      # (tudo em C, sem percorrer a cadeia símbolo a símbolo)
+      marcadores = dict(zip(self.regras_producao, livres))
+      tabela = str.maketrans(marcadores)
+      for _ in range(iteracoes):
+        cadeia_atual = cadeia_atual.translate(tabela)
+        for simbolo, producao in self.regras_producao.items():
+          cadeia_atual = cadeia_atual.replace(marcadores[simbolo], producao)
+      return cadeia_atual
+
     for _ in range(iteracoes):
-      nova_cadeia = ""
-      for simbolo in cadeia_atual:
-          nova_cadeia += self.regras_producao.get(simbolo, simbolo)
-      cadeia_atual = nova_cadeia
+      cadeia_atual = "".join(self.regras_producao.get(simbolo, simbolo) for simbolo in cadeia_atual)
     return cadeia_atual
 
+  def gerar_simbolos(self, iteracoes: int) -> Iterator[str]:
+    # mesma cadeia de gerar_cadeia, mas percorrendo a derivação em profundidade:
+    # guarda só um iterador por nível em vez da cadeia inteira
+    pilha = [iter(self.axioma)]
+    while pilha:
+      for simbolo in pilha[-1]:
+        if len(pilha) <= iteracoes and simbolo in self.regras_producao:
+          pilha.append(iter(self.regras_producao[simbolo]))
+          break
+        yield simbolo
+      else:
+        pilha.pop()
+
+class Rastro:
+  # gancho de rastreamento do AutomatoPilha: guarda as configurações (passo,
+  # estado, símbolo lido, transição, pilha) de um a cada `amostragem` passos
+  # num buffer circular com as últimas `capacidade`, para ver depois onde uma
+  # cadeia foi rejeitada. Com saida (ex: print) também mostra na hora.
+  # Sem rastro (o padrão) o autômato não monta nada disso
+  def __init__(self, capacidade: int = 100, amostragem: int = 1, saida: Optional[Callable] = None):
+    self.configuracoes = deque(maxlen=capacidade)
+    self.amostragem = amostragem
+    self.saida = saida
+
+  def passo(self, passo: int, estado: str, simbolo: str, transicao: Optional[Transicao], pilha: List[str]):
+    if passo % self.amostragem:
+      return
+    configuracao = (passo, estado, simbolo, transicao, tuple(pilha))
+    self.configuracoes.append(configuracao)
+    if self.saida is not None:
+      self.saida(self.formatar(configuracao))
+
+  def evento(self, mensagem: str):
+    if self.saida is not None:
+      self.saida(mensagem)
+
+  @staticmethod
+  def formatar(configuracao) -> str:
+    passo, estado, simbolo, transicao, pilha = configuracao
+    if transicao is None:
+      return f"{passo}: {estado} lendo {simbolo!r}, pilha {list(pilha)}: nenhuma transição válida"
+    return (f"{passo}: {estado} lendo {simbolo!r}, pilha {list(pilha)} -> {transicao.estado_destino}"
+            f" (desempilha {transicao.simbolo_desempilhavel!r}, empilha {transicao.simbolos_empilhar})")
+
+  def despejar(self) -> str:
+    # as últimas configurações guardadas, uma por linha
+    return "\n".join(self.formatar(configuracao) for configuracao in self.configuracoes)
+
+def primeira_valida(transicoes: List[Transicao], valida: Callable, chave) -> Optional[Transicao]:
+  # a mesma escolha da busca linear: a primeira da lista com valida(t, *chave)
+  return next((t for t in transicoes if valida(t, *chave)), None)
+
+def indexar(transicoes: List[Transicao], valida: Callable, chaves: Iterable) -> Dict:
+  # primeira transição válida de cada chave possível, calculada uma vez só:
+  # cada passo do validar_cadeia vira uma consulta no dicionário
+  return {chave: primeira_valida(transicoes, valida, chave) for chave in chaves}
+
+def topos_possiveis(transicoes: List[Transicao]) -> Set[Optional[str]]:
+  # tudo que pode estar no topo da pilha (None = pilha vazia)
+  return ({t.simbolo_desempilhavel for t in transicoes if t.simbolo_desempilhavel}
+          | {s for t in transicoes for s in t.simbolos_empilhar} | {None})
+
 @dataclass
 class AutomatoPilha:
 
@@ -54,48 +193,116 @@ class AutomatoPilha:
   estado_intermediario: str
   estado_final: str
   numero_niveis: int
+  rastro: Optional[Rastro] = None
+  pilha_compacta: bool = True  #False usa uma lista comum
+  _compilado: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
-  def validar_cadeia(self, cadeia: str, transicoes: List[Transicao]) -> bool:
+  def validar_cadeia(self, cadeia: Iterable[str], transicoes: List[Transicao]) -> bool:
+    # cadeia pode ser uma string ou qualquer iterável de símbolos (ex: gerar_simbolos)
     estado_atual = self.estado_inicial
-    pilha: List[str] = ['$']  # simbolo inicial de pilha
-    print(f"Iniciando validação da cadeia: {cadeia}")
-    
-    i = 0  #posicao atual de iteracao da cadeia
+    pilha = PilhaCompacta(['$']) if self.pilha_compacta else ['$']  # simbolo inicial de pilha
+    rastro = self.rastro
+    if rastro is not None:
+      rastro.evento("Iniciando validação da cadeia")
 
-    while i <= len(cadeia):
-       if i < len(cadeia):
-            simbolo = cadeia[i]
-       else:
-            simbolo = '' 
-            
-       print(estado_atual)
-
-       transicoes_validas = [
-          t for t in transicoes 
-            if (t.estado_origem == estado_atual and t.simbolo_desempilhavel == '$')
-              or ((t.estado_origem == self.estado_intermediario and 
-                  t.simbolo_leitura == simbolo and 
-                  (not t.simbolos_empilhar or
-                  not pilha or 
-                  t.simbolo_desempilhavel == pilha[-1])))
-              or ((t.estado_origem == self.estado_intermediario and  
-                  t.simbolo_desempilhavel == pilha[-1]))
-        ]      
-       if not transicoes_validas:
+    # sem rastro cada consulta já aplica as transições vazias seguidas de uma
+    # vez; com rastro vai uma transição por passo, para o rastro ver todas
+    passos, simples, fechos = self.compilar(transicoes)
+    tabela, limite = (fechos, None) if rastro is None else (simples, 1)
+    topo = pilha.topo if self.pilha_compacta else lambda: pilha[-1] if pilha else None
+    simbolos = iter(cadeia)
+    simbolo = next(simbolos, '')  # '' marca o fim da cadeia
+    passo = 0
+
+    while True:
+       chave = (estado_atual, simbolo, topo())
+       try:
+          efeito = tabela[chave]
+       except KeyError:  # símbolo fora do alfabeto
+          efeito = tabela[chave] = self._fechar(passos, transicoes, chave, limite)
+       if efeito is None and simbolo == '':
+          break  # cadeia lida e sem transição vazia: decide pelo estado e pela pilha
+       if rastro is not None:
+          rastro.passo(passo, estado_atual, simbolo, efeito and efeito[4], pilha)
+       if efeito is None:
           return False
-       transicao = transicoes_validas[0]
-       print(transicao)
-
-       if (transicao.simbolo_leitura != '' or simbolo == ''):
-        i += 1  
-       pilha = transicao.aplicar(pilha)
-       estado_atual = transicao.estado_destino
-       print(f"Pilha após transição: {pilha}")
+       passo += 1
+
+       desempilha, empilha, estado_atual, avancar, _ = efeito
+       if desempilha:
+          pilha.pop()
+       if empilha:
+          pilha.extend(empilha)
+
+       if avancar:
+        simbolo = next(simbolos, '')
        
     # Verifica se chegou ao estado final com pilha vazia
-    return estado_atual == self.estado_final and pilha == []
+    return estado_atual == self.estado_final and not pilha
+
+  def compilar(self, transicoes: List[Transicao]):
+    # tabelas do validar_cadeia, montadas uma vez para cada lista de transições
+    # (que não deve mudar depois): passos leva (estado, símbolo lido, topo) à
+    # primeira transição válida, simples ao efeito dela na pilha e fechos ao
+    # efeito dela somado ao das transições vazias que vêm em seguida
+    if self._compilado is None or self._compilado[0] is not transicoes:
+      passos = self.indexar_transicoes(transicoes)
+      simples = {chave: self._fechar(passos, transicoes, chave, 1) for chave in passos}
+      fechos = {chave: self._fechar(passos, transicoes, chave) for chave in passos}
+      self._compilado = (transicoes, passos, simples, fechos)
+    return self._compilado[1:]
 
+  def _fechar(self, passos: Dict, transicoes: List[Transicao], chave, limite: Optional[int] = None):
+    # aplica até limite transições a partir de chave numa pilha da qual só se
+    # conhece o topo, parando quando uma delas lê o símbolo ou quando o topo
+    # seguinte já é do resto desconhecido da pilha. Devolve (desempilha o topo,
+    # símbolos a empilhar da base para o topo, estado final, avança na cadeia,
+    # última transição), ou None se nenhuma transição vale para chave
+    estado, simbolo, topo = chave
+    conhecida = [] if topo is None else [topo]
+    base = len(conhecida)  #quantos símbolos do começo de conhecida já estavam na pilha
+    ultima = None
+    avanca = False
+    for _ in range(limite or len(transicoes) + 1):
+      if conhecida:
+        atual = conhecida[-1]
+      elif topo is None:
+        atual = None  #a pilha estava vazia, então continua vazia
+      else:
+        break
+      chave_atual = (estado, simbolo, atual)
+      if chave_atual in passos:
+        t = passos[chave_atual]
+      else:
+        t = primeira_valida(transicoes, self._valida, chave_atual)
+      if t is None:
+        break
+      if conhecida and t.simbolo_desempilhavel and conhecida[-1] == t.simbolo_desempilhavel:
+        conhecida.pop()
+        base = min(base, len(conhecida))
+      conhecida.extend(reversed(t.simbolos_empilhar))
+      estado = t.estado_destino
+      ultima = t
+      if t.simbolo_leitura != '':
+        avanca = True
+        break
+    if ultima is None:
+      return None
+    return (topo is not None and base == 0, tuple(conhecida[base:]), estado, avanca, ultima)
 
+  def _valida(self, t: Transicao, estado: str, simbolo: str, topo: Optional[str]) -> bool:
+    # critério da transição válida; topo None = pilha vazia
+    return ((t.estado_origem == estado and t.simbolo_desempilhavel == '$')
+            or (t.estado_origem == self.estado_intermediario and
+                t.simbolo_leitura == simbolo and
+                (not t.simbolo_desempilhavel or t.simbolo_desempilhavel == topo))
+            or (t.estado_origem == self.estado_intermediario and t.simbolo_leitura == '' and
+                topo is not None and t.simbolo_desempilhavel == topo))
+
+  def indexar_transicoes(self, transicoes: List[Transicao]) -> Dict[Tuple[str, str, Optional[str]], Optional[Transicao]]:
+    estados = {t.estado_origem for t in transicoes} | {t.estado_destino for t in transicoes}
+    simbolos = {t.simbolo_leitura for t in transicoes} | {''}
+    return indexar(transicoes, self._valida, product(estados, simbolos, topos_possiveis(transicoes)))
 
   def construir_transicoes(self) -> List[Transicao]:
     transicoes = []
@@ -122,11 +329,61 @@ class AutomatoPilha:
 
     transicoes.append(Transicao(self.estado_intermediario, self.estado_final, '', '$', []))
             
-    print(transicoes)
+    if self.rastro is not None:
+      self.rastro.evento(f"{len(transicoes)} transições: {transicoes}")
 
     return transicoes
 
 
+NIVEL_DESLOCAMENTO = 16  #cada símbolo da pilha é (nivel << 16) | id da variável
+
+@dataclass
+class AutomatoNiveis:
+  # mesma linguagem do AutomatoPilha (variáveis conferidas pela pilha,
+  # constantes lidas livremente), mas sem uma transição por nível: a pilha
+  # guarda inteiros (nível, id da variável) e a única tabela é a das produções
+  # por id, então nada precisa ser montado de novo para outro numero_niveis
+  l_system: LSystem
+  ids: Dict[str, int] = field(init=False)
+  producoes: List[Tuple[int, ...]] = field(init=False)
+
+  def __post_init__(self):
+    variaveis = [simbolo for simbolo, tipo in self.l_system.alfabeto.items() if tipo == 'variavel']
+    self.ids = {simbolo: i for i, simbolo in enumerate(variaveis)}
+    # variável sem regra se reescreve nela mesma
+    self.producoes = [
+      tuple(self.ids[s] for s in self.l_system.regras_producao.get(simbolo, simbolo) if s in self.ids)
+      for simbolo in variaveis
+    ]
+
+  def validar_cadeia(self, cadeia: Iterable[str], numero_niveis: int) -> bool:
+    ids = self.ids
+    producoes = self.producoes
+    mascara = (1 << NIVEL_DESLOCAMENTO) - 1
+    alvo = numero_niveis << NIVEL_DESLOCAMENTO  #nível das variáveis que são lidas
+    incremento = 1 << NIVEL_DESLOCAMENTO
+    # empilha em ordem reversa: o topo é a próxima variável esperada
+    pilha = [ids[s] for s in reversed(self.l_system.axioma) if s in ids]
+
+    def expandir():
+      # troca o topo pela produção no nível seguinte até o topo chegar em numero_niveis
+      while pilha and pilha[-1] < alvo:
+        topo = pilha.pop()
+        nivel = (topo & ~mascara) + incremento
+        pilha.extend(nivel | i for i in reversed(producoes[topo & mascara]))
+
+    for simbolo in cadeia:
+      if simbolo in ids:
+        expandir()
+        if not pilha or pilha[-1] != alvo | ids[simbolo]:
+          return False
+        pilha.pop()
+      elif self.l_system.alfabeto.get(simbolo) != 'constante':
+        return False
+    expandir()
+    return not pilha
+
+
 def gerar_alfabeto_da_pilha(n, alfabeto):
   #o alfabeto da  pilha vai ter so as variaveis
   variaveis = {
@@ -171,7 +428,8 @@ def demonstrar_validacao():
       estado_final='q2',
       l_system=l_system,
       alfabeto_pilha=alfabeto_pilha,
-      numero_niveis=n
+      numero_niveis=n,
+      rastro=Rastro(saida=print)
   )
 
   transicoes = automato.construir_transicoes()
@@ -179,5 +437,7 @@ def demonstrar_validacao():
   resultado = automato.validar_cadeia(cadeia, transicoes)
 
   print("RESULTADO: ", resultado)
+  print("RESULTADO (sem transições por nível): ", AutomatoNiveis(l_system).validar_cadeia(cadeia, n))
 
-demonstrar_validacao()
\ No newline at end of file
+if __name__ == "__main__":
+  demonstrar_validacao()
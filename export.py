@@ -0,0 +1,176 @@
+# exportação do desenho para arquivo, sem turtle/Tk
+import struct
+import sys
+import zlib
+from multiprocessing import Pool
+
+from geometry import PALETTE
+
+try:
+    import numpy as np
+except ImportError:  #só o PNG precisa
+    np = None
+
+SVG_HEADER = '<svg xmlns="http://www.w3.org/2000/svg" viewBox="'
+# espaço reservado para o viewBox, preenchido no final com o repr de cada
+# valor: o repr de um float tem no máximo 24 caracteres (ex:
+# -2.2250738585072014e-308), então os quatro sempre cabem
+VIEWBOX_WIDTH = 4 * len(repr(-sys.float_info.min)) + 3
+
+
+def write_svg(path, segments, margin=10):
+    # segments: iterável de (x0, y0, x1, y1, cor, largura), por exemplo
+    # geometry.iter_segments. Escreve conforme os segmentos chegam (memória
+    # constante): segmentos seguidos com a mesma cor e largura, em que um
+    # começa onde o anterior terminou, viram uma única polyline. O viewBox só
+    # é conhecido no fim, então fica um espaço reservado no cabeçalho que é
+    # sobrescrito depois. Devolve (segmentos, polylines)
+    count = lines = 0
+    xmin = ymin = float("inf")
+    xmax = ymax = float("-inf")
+    with open(path, "wb", buffering=1 << 20) as out:
+        out.write(b'<?xml version="1.0" encoding="UTF-8"?>\n' + SVG_HEADER.encode())
+        viewbox_at = out.tell()
+        out.write(b" " * VIEWBOX_WIDTH + b'">\n')
+        out.write(b'<g fill="none" stroke-linecap="round" stroke-linejoin="round">\n')
+        last = None  #(cor, largura, x, y) do fim da polyline aberta
+        for x0, y0, x1, y1, color, width in segments:
+            # o turtle tem y para cima e o SVG para baixo
+            y0, y1 = 0.0 - y0, 0.0 - y1
+            if last == (color, width, x0, y0):
+                out.write(b" %.3f,%.3f" % (x1, y1))
+            else:
+                if last is not None:
+                    out.write(b'"/>\n')
+                out.write(b'<polyline stroke="%s" stroke-width="%d" points="%.3f,%.3f %.3f,%.3f'
+                          % (PALETTE[color].encode(), width, x0, y0, x1, y1))
+                lines += 1
+            last = (color, width, x1, y1)
+            count += 1
+            xmin, xmax = min(xmin, x0, x1), max(xmax, x0, x1)
+            ymin, ymax = min(ymin, y0, y1), max(ymax, y0, y1)
+        if last is not None:
+            out.write(b'"/>\n')
+        out.write(b"</g>\n</svg>\n")
+        if not count:
+            xmin = ymin = xmax = ymax = 0.0
+        viewbox = " ".join(map(repr, (xmin - margin, ymin - margin, xmax - xmin + 2 * margin,
+                                      ymax - ymin + 2 * margin))).encode()
+        if len(viewbox) > VIEWBOX_WIDTH:
+            raise ValueError(f"viewBox com {len(viewbox)} caracteres não cabe no espaço reservado")
+        out.seek(viewbox_at)
+        out.write(viewbox.ljust(VIEWBOX_WIDTH))
+    return count, lines
+
+
+# Rasterização sem Tk: os segmentos (arrays do geometry) são amostrados
+# ao longo do comprimento (uma amostra por pixel) e cada amostra carimba um
+# quadrado da largura do traço no buffer RGB. A imagem é dividida em faixas
+# horizontais, rasterizadas num pool de processos e gravadas no PNG uma a
+# uma, então a imagem inteira nunca fica na memória.
+
+# as cores com os mesmos valores que o Tk usa para esses nomes
+RGB = ((0, 0, 0), (0, 255, 0), (0, 0, 255), (255, 0, 0), (255, 255, 0), (255, 165, 0))
+TILE_ROWS = 256
+
+
+def to_pixels(segments, size, margin=10, viewport=None):
+    # coordenadas do mundo -> pixels (y para baixo), com o maior lado do
+    # desenho (ou da janela) ocupando size - 2 * margin pixels
+    if viewport is None:
+        if len(segments.x0):
+            xmin = min(segments.x0.min(), segments.x1.min())
+            xmax = max(segments.x0.max(), segments.x1.max())
+            ymin = min(segments.y0.min(), segments.y1.min())
+            ymax = max(segments.y0.max(), segments.y1.max())
+        else:
+            xmin = ymin = xmax = ymax = 0.0
+    else:
+        xmin, ymin, xmax, ymax = viewport
+    scale = (size - 2 * margin) / max(xmax - xmin, ymax - ymin, 1e-9)
+    width = int(np.ceil((xmax - xmin) * scale)) + 2 * margin
+    height = int(np.ceil((ymax - ymin) * scale)) + 2 * margin
+    pixels = ((segments.x0 - xmin) * scale + margin, (ymax - segments.y0) * scale + margin,
+              (segments.x1 - xmin) * scale + margin, (ymax - segments.y1) * scale + margin,
+              segments.color, segments.width)
+    return pixels, width, height
+
+
+def _raster_tile(task):
+    (x0, y0, x1, y1, color, width), top, rows, columns = task
+    tile = np.full((rows, columns, 3), 255, dtype=np.uint8)
+    if not len(x0):
+        return tile
+    # amostras ao longo de cada segmento, na ordem em que foram desenhados
+    samples = np.ceil(np.hypot(x1 - x0, y1 - y0)).astype(np.int64) + 1
+    owner = np.repeat(np.arange(len(x0)), samples)
+    first = np.repeat(np.cumsum(samples) - samples, samples)
+    t = (np.arange(len(owner)) - first) / np.repeat(np.maximum(samples - 1, 1), samples)
+    px = x0[owner] + t * (x1 - x0)[owner]
+    py = y0[owner] + t * (y1 - y0)[owner] - top
+    rgb = np.array(RGB, dtype=np.uint8)[color[owner]]
+    reach = width[owner].astype(np.float64) / 2
+    # carimba um quadrado da largura do traço em volta de cada amostra
+    radius = int(np.ceil(width.max() / 2))
+    for oy in range(-radius, radius + 1):
+        for ox in range(-radius, radius + 1):
+            inside = np.maximum(abs(ox), abs(oy)) <= np.maximum(reach, 0.5)
+            ix = np.rint(px + ox).astype(np.int64)
+            iy = np.rint(py + oy).astype(np.int64)
+            keep = inside & (ix >= 0) & (ix < columns) & (iy >= 0) & (iy < rows)
+            tile[iy[keep], ix[keep]] = rgb[keep]
+    return tile
+
+
+def raster_tiles(segments, size, margin=10, viewport=None, workers=1):
+    # (largura, altura, gerador das faixas da imagem em ordem)
+    (x0, y0, x1, y1, color, width), columns, height = to_pixels(segments, size, margin, viewport)
+    low = np.minimum(y0, y1) - width
+    high = np.maximum(y0, y1) + width
+    tasks = []
+    for top in range(0, height, TILE_ROWS):
+        rows = min(TILE_ROWS, height - top)
+        # só os segmentos que passam pela faixa
+        mask = (high >= top) & (low < top + rows)
+        tasks.append(((x0[mask], y0[mask], x1[mask], y1[mask], color[mask], width[mask]),
+                      top, rows, columns))
+
+    def bands():
+        if workers > 1:
+            with Pool(workers) as pool:
+                yield from pool.imap(_raster_tile, tasks)
+        else:
+            for task in tasks:
+                yield _raster_tile(task)
+
+    return columns, height, bands()
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def write_png(path, width, height, bands):
+    # PNG RGB de 8 bits só com a biblioteca padrão (zlib); bands são faixas
+    # (linhas, width, 3) em uint8, comprimidas e gravadas conforme chegam
+    compressor = zlib.compressobj(6)
+    with open(path, "wb") as out:
+        out.write(b"\x89PNG\r\n\x1a\n")
+        out.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        for band in bands:
+            # cada linha começa com o byte do filtro (0 = nenhum)
+            rows = np.zeros((band.shape[0], width * 3 + 1), dtype=np.uint8)
+            rows[:, 1:] = band.reshape(band.shape[0], width * 3)
+            data = compressor.compress(rows.tobytes())
+            if data:
+                out.write(_png_chunk(b"IDAT", data))
+        out.write(_png_chunk(b"IDAT", compressor.flush()))
+        out.write(_png_chunk(b"IEND", b""))
+
+
+def write_raster(path, segments, size, margin=10, viewport=None, workers=1):
+    if np is None:
+        raise ImportError("a exportação para PNG precisa do pacote numpy")
+    width, height, bands = raster_tiles(segments, size, margin, viewport, workers)
+    write_png(path, width, height, bands)
+    return width, height
@@ -0,0 +1,828 @@
+# interpretação da cadeia do L-System sem turtle/Tk: percorre os mesmos
+# comandos do LSystem.draw (ex1.py) e devolve os segmentos desenhados como
+# arrays do NumPy, que depois podem ser redesenhados pelo turtle ou exportados
+import math
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from multiprocessing import Pool
+
+try:
+    import numpy as np
+except ImportError:  #só quem monta os arrays precisa
+    np = None
+
+# cor de cada símbolo que desenha; o índice na PALETTE é o id da cor
+PALETTE = ("black", "green", "blue", "red", "yellow", "orange")
+COLORS = {"F": 0, "G": 1, "B": 2, "R": 3, "Y": 4, "O": 5}
+
+Segments = namedtuple("Segments", "x0 y0 x1 y1 color width")
+
+
+def heading_step(heading, distance):
+    # deslocamento de um passo com a tartaruga virada para heading (graus,
+    # 0 = leste, sentido anti-horário, igual ao modo padrão do turtle)
+    radians = math.radians(heading)
+    return distance * math.cos(radians), distance * math.sin(radians)
+
+
+def interpret(symbols, angle, distance, largura):
+    # F/G/B/R/Y/O andam desenhando com a sua cor, f anda sem desenhar,
+    # + vira para a direita e - para a esquerda, [ e ] guardam e restauram
+    # posição e direção (a cor e a largura continuam), S<n> muda a largura
+    if np is None:
+        raise ImportError("a geometria sem turtle precisa do pacote numpy")
+    columns = _columns()
+    _run(symbols, angle, distance, (0.0, 0.0, 0.0), largura, [], columns)
+    return _segments(columns)
+
+
+def _columns():
+    return array("d"), array("d"), array("d"), array("d"), array("B"), array("H")
+
+
+def _segments(columns):
+    x0, y0, x1, y1, color, width = columns
+    return Segments(
+        np.frombuffer(x0, dtype=np.float64), np.frombuffer(y0, dtype=np.float64),
+        np.frombuffer(x1, dtype=np.float64), np.frombuffer(y1, dtype=np.float64),
+        np.frombuffer(color, dtype=np.uint8), np.frombuffer(width, dtype=np.uint16),
+    )
+
+
+def _run(symbols, angle, distance, state, size, stack, columns):
+    # laço do interpretador a partir de um estado e de uma pilha quaisquer
+    # (o paralelo começa cada trecho no meio da cadeia)
+    x0, y0, x1, y1, color, width = columns
+    x, y, heading = state
+    dx, dy = heading_step(heading, distance)
+    digits = None  #dígitos do S<n> que está sendo lido
+    for cmd in symbols:
+        if digits is not None:
+            if "0" <= cmd <= "9":
+                digits += cmd
+                continue
+            if digits:
+                size = int(digits)
+            digits = None
+        if cmd in COLORS:
+            x0.append(x)
+            y0.append(y)
+            x += dx
+            y += dy
+            x1.append(x)
+            y1.append(y)
+            color.append(COLORS[cmd])
+            width.append(size)
+        elif cmd == "f":
+            x += dx
+            y += dy
+        elif cmd == "+":
+            heading -= angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "-":
+            heading += angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "[":
+            stack.append((x, y, heading))
+        elif cmd == "]":
+            x, y, heading = stack.pop()
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "S":
+            digits = ""
+
+
+def iter_segments(symbols, angle, distance, largura):
+    # mesma interpretação do interpret, mas devolvendo um segmento por vez
+    # (x0, y0, x1, y1, cor, largura), sem NumPy e com memória constante
+    x = y = heading = 0.0
+    dx, dy = heading_step(heading, distance)
+    size = largura
+    stack = []
+    digits = None
+    for cmd in symbols:
+        if digits is not None:
+            if "0" <= cmd <= "9":
+                digits += cmd
+                continue
+            if digits:
+                size = int(digits)
+            digits = None
+        if cmd in COLORS:
+            yield x, y, x + dx, y + dy, COLORS[cmd], size
+            x += dx
+            y += dy
+        elif cmd == "f":
+            x += dx
+            y += dy
+        elif cmd == "+":
+            heading -= angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "-":
+            heading += angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "[":
+            stack.append((x, y, heading))
+        elif cmd == "]":
+            x, y, heading = stack.pop()
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "S":
+            digits = ""
+
+
+# Ângulos que dividem 360 (60, 90, 120, 45...): só existem n = 360 / angle
+# direções, e o passo na direção k é a raiz da unidade z^k (z = e^(2πi/n)).
+# Escrevendo z^k na base 1, z, ..., z^(m-1) do anel Z[z] (m = grau do
+# polinômio ciclotômico de n), cada direção vira um vetor de inteiros e a
+# posição é sempre uma soma exata desses vetores: sem sin/cos no laço, sem
+# erro acumulado, e o mesmo ponto tem sempre as mesmas coordenadas.
+LatticeSegments = namedtuple("LatticeSegments", "start direction color width basis")
+LATTICE_BITS = 64  #bits de cada coordenada dentro da posição empacotada
+LATTICE_BIAS = 1 << (LATTICE_BITS - 2)
+LATTICE_MAX_DIRECTIONS = 12  #acima disso (m > 4 coordenadas) o float é mais rápido
+
+
+@lru_cache(maxsize=None)
+def _cyclotomic(n):
+    # coeficientes (do grau 0 para cima) do polinômio ciclotômico de n:
+    # x^n - 1 dividido pelos ciclotômicos dos divisores de n
+    poly = [-1] + [0] * (n - 1) + [1]
+    for d in range(1, n):
+        if n % d == 0:
+            divisor = _cyclotomic(d)
+            quotient = [0] * (len(poly) - len(divisor) + 1)
+            for i in range(len(quotient) - 1, -1, -1):
+                quotient[i] = poly[i + len(divisor) - 1]  #os divisores são mônicos
+                for j, c in enumerate(divisor):
+                    poly[i + j] -= quotient[i] * c
+            poly = quotient
+    return tuple(poly)
+
+
+@lru_cache(maxsize=None)
+def lattice_directions(angle):
+    # vetor inteiro de cada direção k = 0..n-1, ou None se angle não divide
+    # 360 ou dá mais de LATTICE_MAX_DIRECTIONS direções
+    if not angle:
+        return None
+    n = round(360 / angle)
+    if n < 1 or n > LATTICE_MAX_DIRECTIONS or abs(n * angle - 360) > 1e-9:
+        return None
+    poly = _cyclotomic(n)
+    m = len(poly) - 1
+    power = [1] + [0] * (m - 1)
+    directions = []
+    for _ in range(n):
+        directions.append(tuple(power))
+        # multiplica por z e reduz o termo de grau m pelo polinômio
+        carry = power[-1]
+        power = [0] + power[:-1]
+        for j in range(m):
+            power[j] -= carry * poly[j]
+    return tuple(directions)
+
+
+def _pack(vector):
+    # vetor de inteiros -> um int só, LATTICE_BITS por coordenada: somar
+    # posições empacotadas soma cada coordenada (o viés evita empréstimos)
+    return sum(c << (LATTICE_BITS * j) for j, c in enumerate(vector))
+
+
+def interpret_lattice(symbols, angle, largura):
+    # mesma interpretação do interpret em coordenadas exatas: início (m
+    # inteiros) e direção (0..n-1) de cada segmento; None se o ângulo não
+    # divide 360
+    directions = lattice_directions(angle)
+    if directions is None:
+        return None
+    if np is None:
+        raise ImportError("a geometria sem turtle precisa do pacote numpy")
+    n = len(directions)
+    m = len(directions[0])
+    steps = [_pack(vector) for vector in directions]
+    nbytes = LATTICE_BITS // 8 * m
+    starts = bytearray()
+    direction, color, width = array("H"), array("B"), array("H")
+    position = _pack([LATTICE_BIAS] * m)
+    k = 0
+    step = steps[0]
+    size = largura
+    stack = []
+    digits = None
+    for cmd in symbols:
+        if digits is not None:
+            if "0" <= cmd <= "9":
+                digits += cmd
+                continue
+            if digits:
+                size = int(digits)
+            digits = None
+        if cmd in COLORS:
+            starts += position.to_bytes(nbytes, "little")
+            direction.append(k)
+            color.append(COLORS[cmd])
+            width.append(size)
+            position += step
+        elif cmd == "f":
+            position += step
+        elif cmd == "+":
+            k = (k - 1) % n
+            step = steps[k]
+        elif cmd == "-":
+            k = (k + 1) % n
+            step = steps[k]
+        elif cmd == "[":
+            stack.append((position, k))
+        elif cmd == "]":
+            position, k = stack.pop()
+            step = steps[k]
+        elif cmd == "S":
+            digits = ""
+    start = np.frombuffer(bytes(starts), dtype=np.uint64).reshape(-1, m).astype(np.int64) - LATTICE_BIAS
+    return LatticeSegments(start, np.frombuffer(direction, dtype=np.uint16),
+                           np.frombuffer(color, dtype=np.uint8),
+                           np.frombuffer(width, dtype=np.uint16),
+                           np.array(directions, dtype=np.int64))
+
+
+def lattice_segments(lattice, distance):
+    # coordenadas exatas -> Segments em float: cada coordenada j conta
+    # passos de tamanho distance na direção j (z^j)
+    m = lattice.basis.shape[1]
+    turns = 2 * math.pi * np.arange(m) / len(lattice.basis)
+    end = lattice.start + lattice.basis[lattice.direction]
+    cos = distance * np.cos(turns)
+    sin = distance * np.sin(turns)
+    return Segments(lattice.start @ cos, lattice.start @ sin, end @ cos, end @ sin,
+                    lattice.color, lattice.width)
+
+
+def simplify(segments, decimals=9, lattice=None):
+    # tira os segmentos repetidos (mesmas pontas em qualquer sentido, mesma
+    # cor e largura; fica a última vez que foi desenhado, que é a que aparece
+    # por cima) e junta os seguidos que continuam na mesma reta com a mesma
+    # cor e largura. Com lattice (o interpret_lattice dos mesmos segmentos) a
+    # comparação é exata, pelas coordenadas inteiras e pela direção; senão as
+    # pontas são comparadas arredondadas em decimals casas
+    if np is None:
+        raise ImportError("a geometria sem turtle precisa do pacote numpy")
+    x0, y0, x1, y1, color, width = segments
+    if not len(x0):
+        return segments
+    if lattice is None:
+        # chave de cada segmento com as pontas em ordem (o sentido não
+        # importa); + 0.0 junta -0.0 com 0.0
+        a = np.round(np.stack([x0, y0], axis=1), decimals) + 0.0
+        b = np.round(np.stack([x1, y1], axis=1), decimals) + 0.0
+        swap = (a[:, 0] > b[:, 0]) | ((a[:, 0] == b[:, 0]) & (a[:, 1] > b[:, 1]))
+    else:
+        # (início, direção) e, andando ao contrário, (fim, direção oposta);
+        # só existe direção oposta com n par
+        n = len(lattice.basis)
+        direction = lattice.direction.astype(np.int64)
+        a = np.column_stack([lattice.start, direction])
+        b = a
+        if n % 2 == 0:
+            b = np.column_stack([lattice.start + lattice.basis[direction], (direction + n // 2) % n])
+        difference = b - a
+        column = np.argmax(difference != 0, axis=1)
+        swap = difference[np.arange(len(a)), column] < 0
+    keys = np.column_stack([np.where(swap[:, None], b, a), np.where(swap[:, None], a, b),
+                            color, width])
+    _, last = np.unique(keys[::-1], axis=0, return_index=True)
+    keep = np.sort(len(x0) - 1 - last)
+    x0, y0, x1, y1, color, width = (column[keep] for column in segments)
+
+    # junta i com i + 1 quando i + 1 começa onde i termina, no mesmo sentido
+    if lattice is None:
+        dx, dy = x1 - x0, y1 - y0
+        cross = dx[:-1] * dy[1:] - dy[:-1] * dx[1:]
+        dot = dx[:-1] * dx[1:] + dy[:-1] * dy[1:]
+        tolerance = 10.0 ** -decimals
+        joins = ((np.abs(x1[:-1] - x0[1:]) <= tolerance) & (np.abs(y1[:-1] - y0[1:]) <= tolerance)
+                 & (np.abs(cross) <= tolerance * np.hypot(dx[:-1], dy[:-1]) * np.hypot(dx[1:], dy[1:]))
+                 & (dot > 0))
+    else:
+        start = lattice.start[keep]
+        direction = lattice.direction[keep]
+        end = start + lattice.basis[direction]
+        joins = (end[:-1] == start[1:]).all(axis=1) & (direction[:-1] == direction[1:])
+    joins &= (color[:-1] == color[1:]) & (width[:-1] == width[1:])
+    first = np.flatnonzero(np.concatenate([[True], ~joins]))
+    last = np.concatenate([first[1:] - 1, [len(x0) - 1]])
+    return Segments(x0[first], y0[first], x1[last], y1[last], color[first], width[first])
+
+
+def rows(segments):
+    # segmentos em arrays -> um (x0, y0, x1, y1, cor, largura) por vez
+    return zip(*(column.tolist() for column in segments))
+
+
+# Interpretação paralela. Cada trecho da cadeia é um movimento rígido do
+# estado da tartaruga (translação + rotação), relativo a um estado de
+# referência: o estado de entrada, ou, se o trecho tem ] sem o [
+# correspondente, o quadro que ele tira da pilha de fora. Os [ ... ]
+# completos não mudam o estado. Então: (1) cada processo resume o seu trecho
+# sem saber onde a tartaruga está, (2) a varredura dos resumos em ordem dá o
+# estado e a pilha no começo de cada trecho, (3) cada processo interpreta o
+# seu trecho a partir daí e os segmentos são concatenados em ordem.
+
+def compose(reference, transform):
+    # aplica um movimento relativo (tx, ty, giro) a um estado (x, y, direção)
+    x, y, heading = reference
+    tx, ty, turn = transform
+    radians = math.radians(heading)
+    cos, sin = math.cos(radians), math.sin(radians)
+    return x + cos * tx - sin * ty, y + sin * tx + cos * ty, heading + turn
+
+
+def summarize(chunk, angle, distance):
+    # (quantos quadros de fora o trecho desempilha, movimento final relativo
+    # à referência, quadros que ele deixa empilhados, última largura S<n>)
+    pops = 0
+    x = y = heading = 0.0
+    dx, dy = distance, 0.0
+    stack = []
+    size = None
+    digits = None
+    for cmd in chunk:
+        if digits is not None:
+            if "0" <= cmd <= "9":
+                digits += cmd
+                continue
+            if digits:
+                size = int(digits)
+            digits = None
+        if cmd in COLORS or cmd == "f":
+            x += dx
+            y += dy
+        elif cmd == "+":
+            heading -= angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "-":
+            heading += angle
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "[":
+            stack.append((x, y, heading))
+        elif cmd == "]":
+            if stack:
+                x, y, heading = stack.pop()
+            else:
+                pops += 1
+                x = y = heading = 0.0
+            dx, dy = heading_step(heading, distance)
+        elif cmd == "S":
+            digits = ""
+    if digits:
+        size = int(digits)
+    return pops, (x, y, heading), stack, size
+
+
+def scan(summaries, largura):
+    # estado, quadros de fora e largura no começo de cada trecho
+    state = (0.0, 0.0, 0.0)
+    stack = []
+    size = largura
+    starts = []
+    for pops, transform, frames, last_size in summaries:
+        if pops > len(stack):
+            raise IndexError("] sem [ correspondente")
+        starts.append((state, stack[len(stack) - pops:], size))
+        if pops:
+            reference = stack[-pops]
+            del stack[-pops:]
+        else:
+            reference = state
+        state = compose(reference, transform)
+        stack.extend(compose(reference, frame) for frame in frames)
+        if last_size is not None:
+            size = last_size
+    return starts
+
+
+def split(text, parts):
+    # limites dos trechos, sem cortar os dígitos de um S<n> no meio
+    step = max(len(text) // parts, 1)
+    bounds = []
+    start = 0
+    while start < len(text):
+        stop = min(start + step, len(text))
+        while stop < len(text) and "0" <= text[stop] <= "9":
+            stop += 1
+        bounds.append((start, stop))
+        start = stop
+    return bounds
+
+
+def _summarize_task(task):
+    return summarize(*task)
+
+
+def _interpret_task(task):
+    chunk, angle, distance, (state, stack, size) = task
+    columns = _columns()
+    _run(chunk, angle, distance, state, size, list(stack), columns)
+    return tuple(column.tobytes() for column in columns)
+
+
+def interpret_parallel(text, angle, distance, largura, workers):
+    # mesmo resultado do interpret (a menos do arredondamento das posições
+    # no começo de cada trecho), com os trechos interpretados em paralelo
+    if np is None:
+        raise ImportError("a geometria sem turtle precisa do pacote numpy")
+    chunks = [text[start:stop] for start, stop in split(text, workers * 4)]
+    with Pool(workers) as pool:
+        summaries = pool.map(_summarize_task, [(chunk, angle, distance) for chunk in chunks])
+        starts = scan(summaries, largura)
+        parts = pool.map(_interpret_task, [(chunk, angle, distance, start)
+                                           for chunk, start in zip(chunks, starts)])
+    columns = _columns()
+    for part in parts:
+        for column, data in zip(columns, part):
+            column.frombytes(data)
+    return _segments(columns)
+
+
+# Geometria instanciada. Todo símbolo X com d reescritas pela frente desenha
+# sempre a mesma figura relativa à tartaruga; só mudam a posição, a direção
+# e a largura herdada. A figura de (X, d) é montada uma vez, no referencial
+# local (origem, direção 0), juntando as figuras dos filhos (c, d - 1) já
+# transformadas, e depois é só girada e transladada para cada ocorrência.
+# Largura 0 nos segmentos guardados quer dizer "herda a largura de fora".
+
+Shape = namedtuple("Shape", "columns end size")  #segmentos locais, movimento final, última largura S<n>
+
+
+class Unsupported(Exception):
+    # a derivação não dá para ser montada por figuras (colchetes que não
+    # fecham dentro da mesma produção); quem chama volta para o interpret
+    pass
+
+
+def place(columns, state, size=None):
+    # gira e translada segmentos locais para o estado (x, y, direção);
+    # com size, a largura herdada (0) vira size
+    x0, y0, x1, y1, color, width = columns
+    x, y, heading = state
+    radians = math.radians(heading)
+    cos, sin = math.cos(radians), math.sin(radians)
+    if size is not None:
+        width = np.where(width == 0, size, width).astype(np.uint16)
+    return (x + cos * x0 - sin * y0, y + sin * x0 + cos * y0,
+            x + cos * x1 - sin * y1, y + sin * x1 + cos * y1, color, width)
+
+
+def instancing_safe(axiom, rules):
+    # os dígitos do S<n> precisam ficar na mesma produção que o S, senão a
+    # largura de uma figura dependeria do que vem depois dela
+    if any(key == "S" or "0" <= key <= "9" for key in rules):
+        return False
+    for text in [axiom] + list(rules.values()):
+        for previous, ch in zip(" " + text, text):
+            if "0" <= ch <= "9" and not (previous == "S" or "0" <= previous <= "9"):
+                return False
+    return True
+
+
+class ShapeCache:
+    # figuras por (símbolo, profundidade, ângulo, distância)
+    def __init__(self, rules):
+        self.rules = rules
+        self.shapes = {}
+
+    def shape(self, symbol, depth, angle, distance):
+        key = (symbol, depth, angle, distance)
+        if key not in self.shapes:
+            self.shapes[key] = self._compose(self.rules[symbol], depth - 1, angle, distance, True)
+        return self.shapes[key]
+
+    def interpret(self, axiom, iterations, angle, distance, largura):
+        # mesma geometria do interpret sobre a iteração N, ou None se a
+        # derivação não der para ser montada por figuras
+        if np is None:
+            raise ImportError("a geometria sem turtle precisa do pacote numpy")
+        if not instancing_safe(axiom, self.rules):
+            return None
+        try:
+            columns, _, _ = self._compose(axiom, iterations, angle, distance, False)
+        except Unsupported:
+            return None
+        x0, y0, x1, y1, color, width = columns
+        width = np.where(width == 0, largura, width).astype(np.uint16)
+        return Segments(x0, y0, x1, y1, color, width)
+
+    def _compose(self, text, depth, angle, distance, closed):
+        # junta, em ordem, os segmentos soltos de text e as figuras dos
+        # símbolos com regra (profundidade depth), no referencial local
+        pieces = []
+        run = _columns()
+        x = y = heading = 0.0
+        dx, dy = distance, 0.0
+        size = None
+        stack = []
+        digits = None
+        for ch in text:
+            if digits is not None:
+                if "0" <= ch <= "9":
+                    digits += ch
+                    continue
+                if digits:
+                    size = int(digits)
+                digits = None
+            if depth > 0 and ch in self.rules:
+                shape = self.shape(ch, depth, angle, distance)
+                if len(run[0]):
+                    pieces.append(tuple(np.frombuffer(column, dtype=column.typecode) for column in run))
+                    run = _columns()
+                pieces.append(place(shape.columns, (x, y, heading), size))
+                x, y, heading = compose((x, y, heading), shape.end)
+                dx, dy = heading_step(heading, distance)
+                if shape.size is not None:
+                    size = shape.size
+            elif ch in COLORS:
+                run[0].append(x)
+                run[1].append(y)
+                x += dx
+                y += dy
+                run[2].append(x)
+                run[3].append(y)
+                run[4].append(COLORS[ch])
+                run[5].append(size or 0)
+            elif ch == "f":
+                x += dx
+                y += dy
+            elif ch == "+":
+                heading -= angle
+                dx, dy = heading_step(heading, distance)
+            elif ch == "-":
+                heading += angle
+                dx, dy = heading_step(heading, distance)
+            elif ch == "[":
+                stack.append((x, y, heading))
+            elif ch == "]":
+                if not stack:
+                    raise Unsupported(ch)
+                x, y, heading = stack.pop()
+                dx, dy = heading_step(heading, distance)
+            elif ch == "S":
+                digits = ""
+        if digits:
+            size = int(digits)
+        if closed and stack:
+            raise Unsupported("[")
+        if len(run[0]):
+            pieces.append(tuple(np.frombuffer(column, dtype=column.typecode) for column in run))
+        if not pieces:
+            pieces.append(tuple(np.frombuffer(column, dtype=column.typecode) for column in _columns()))
+        columns = tuple(np.concatenate(parts) for parts in zip(*pieces))
+        return Shape(columns, (x, y, heading), size)
+
+
+# Recorte por janela (zoom). Para cada (símbolo, profundidade) guarda só o
+# movimento final, a última largura e a caixa envolvente no referencial
+# local, sem os segmentos; na hora de desenhar, uma subárvore cuja caixa
+# (girada e transladada para o estado atual) não encosta na janela é pulada
+# inteira, só avançando o estado. O trabalho cresce com o que aparece na
+# janela, não com o tamanho da derivação. Com uma resolução alvo (nível de
+# detalhe), uma subárvore cuja caixa fica menor que um pixel vira um único
+# traço do início ao fim dela, na cor do primeiro segmento que ela desenha.
+
+Bounds = namedtuple("Bounds", "end size box color")  #box = (xmin, ymin, xmax, ymax) ou None
+
+
+def place_box(box, state):
+    # caixa alinhada aos eixos que contém box girada e transladada para state
+    if box is None:
+        return None
+    xmin, ymin, xmax, ymax = box
+    x, y, heading = state
+    radians = math.radians(heading)
+    cos, sin = math.cos(radians), math.sin(radians)
+    xs = [x + cos * cx - sin * cy for cx in (xmin, xmax) for cy in (ymin, ymax)]
+    ys = [y + sin * cx + cos * cy for cx in (xmin, xmax) for cy in (ymin, ymax)]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def merge_box(box, other):
+    if box is None:
+        return other
+    if other is None:
+        return box
+    return (min(box[0], other[0]), min(box[1], other[1]),
+            max(box[2], other[2]), max(box[3], other[3]))
+
+
+def overlaps(box, viewport):
+    # viewport None é o plano inteiro
+    if box is None or viewport is None:
+        return box is not None
+    return (box[0] <= viewport[2] and box[2] >= viewport[0]
+            and box[1] <= viewport[3] and box[3] >= viewport[1])
+
+
+class BoundsCache:
+    # movimento final, largura e caixa por (símbolo, profundidade, ângulo, distância)
+    def __init__(self, rules):
+        self.rules = rules
+        self.bounds = {}
+
+    def get(self, symbol, depth, angle, distance):
+        key = (symbol, depth, angle, distance)
+        if key not in self.bounds:
+            self.bounds[key] = self._walk(self.rules[symbol], depth - 1, angle, distance,
+                                          (0.0, 0.0, 0.0), None, None, True)
+        return self.bounds[key]
+
+    def interpret(self, axiom, iterations, angle, distance, largura, viewport=None, resolution=None):
+        # segmentos da iteração N que encostam na janela (None = tudo), com
+        # as subárvores menores que um pixel de resolution pixels (na maior
+        # dimensão da janela ou do desenho) colapsadas; None se a derivação
+        # não der para ser resumida por subárvores
+        if np is None:
+            raise ImportError("a geometria sem turtle precisa do pacote numpy")
+        if not instancing_safe(axiom, self.rules):
+            return None
+        columns = _columns()
+        try:
+            pixel = 0.0
+            if resolution:
+                region = viewport
+                if region is None:
+                    region = self._walk(axiom, iterations, angle, distance, (0.0, 0.0, 0.0),
+                                        None, None, False).box or (0.0, 0.0, 0.0, 0.0)
+                pixel = max(region[2] - region[0], region[3] - region[1]) / resolution
+            self._walk(axiom, iterations, angle, distance, (0.0, 0.0, 0.0), largura,
+                       (viewport, columns, pixel), False)
+        except Unsupported:
+            return None
+        return _segments(columns)
+
+    def _walk(self, text, depth, angle, distance, state, size, output, closed):
+        # sem output, resume text (caixa local); com output = (janela,
+        # colunas, pixel), desenha em ordem o que encosta na janela e pula o
+        # resto, colapsando subárvores menores que pixel
+        x, y, heading = state
+        dx, dy = heading_step(heading, distance)
+        box = None
+        first = None  #cor do primeiro segmento desenhado
+        stack = []
+        digits = None
+        for ch in text:
+            if digits is not None:
+                if "0" <= ch <= "9":
+                    digits += ch
+                    continue
+                if digits:
+                    size = int(digits)
+                digits = None
+            if depth > 0 and ch in self.rules:
+                bounds = self.get(ch, depth, angle, distance)
+                placed = place_box(bounds.box, (x, y, heading))
+                if output is None:
+                    box = merge_box(box, placed)
+                    if first is None:
+                        first = bounds.color
+                    end = compose((x, y, heading), bounds.end)
+                elif not overlaps(placed, output[0]):
+                    end = compose((x, y, heading), bounds.end)
+                elif max(placed[2] - placed[0], placed[3] - placed[1]) < output[2]:
+                    end = compose((x, y, heading), bounds.end)
+                    x0, y0, x1, y1, color, width = output[1]
+                    x0.append(x)
+                    y0.append(y)
+                    x1.append(end[0])
+                    y1.append(end[1])
+                    color.append(bounds.color)
+                    width.append(size)
+                else:
+                    end = self._walk(self.rules[ch], depth - 1, angle, distance,
+                                     (x, y, heading), size, output, True).end
+                x, y, heading = end
+                dx, dy = heading_step(heading, distance)
+                if bounds.size is not None:
+                    size = bounds.size
+            elif ch in COLORS:
+                segment = (min(x, x + dx), min(y, y + dy), max(x, x + dx), max(y, y + dy))
+                if output is None:
+                    box = merge_box(box, segment)
+                    if first is None:
+                        first = COLORS[ch]
+                elif overlaps(segment, output[0]):
+                    x0, y0, x1, y1, color, width = output[1]
+                    x0.append(x)
+                    y0.append(y)
+                    x1.append(x + dx)
+                    y1.append(y + dy)
+                    color.append(COLORS[ch])
+                    width.append(size)
+                x += dx
+                y += dy
+            elif ch == "f":
+                x += dx
+                y += dy
+            elif ch == "+":
+                heading -= angle
+                dx, dy = heading_step(heading, distance)
+            elif ch == "-":
+                heading += angle
+                dx, dy = heading_step(heading, distance)
+            elif ch == "[":
+                stack.append((x, y, heading))
+            elif ch == "]":
+                if not stack:
+                    raise Unsupported(ch)
+                x, y, heading = stack.pop()
+                dx, dy = heading_step(heading, distance)
+            elif ch == "S":
+                digits = ""
+        if digits:
+            size = int(digits)
+        if closed and stack:
+            raise Unsupported("[")
+        return Bounds((x, y, heading), size, box, first)
+
+
+def clip(segments, viewport):
+    # só os segmentos cuja caixa encosta na janela
+    xmin, ymin, xmax, ymax = viewport
+    mask = ((np.minimum(segments.x0, segments.x1) <= xmax) & (np.maximum(segments.x0, segments.x1) >= xmin)
+            & (np.minimum(segments.y0, segments.y1) <= ymax) & (np.maximum(segments.y0, segments.y1) >= ymin))
+    return Segments(*(column[mask] for column in segments))
+
+
+# Bytecode do desenho. compile_commands transforma os símbolos numa
+# sequência compacta de pares (opcode, argumento): sequências como FFFF viram
+# um MOVE 4, +++ vira um TURN e trocas de cor/largura que não mudam nada
+# somem. Quem desenha despacha cada opcode por uma tabela em vez de testar
+# símbolo a símbolo.
+
+OP_MOVE, OP_JUMP, OP_TURN, OP_PUSH, OP_POP, OP_COLOR, OP_WIDTH = range(7)
+
+
+def compile_commands(symbols, largura):
+    # MOVE n: anda n passos desenhando; JUMP n: anda n passos sem desenhar;
+    # TURN k: gira k vezes o ângulo para a esquerda (negativo = direita);
+    # PUSH/POP: [ e ]; COLOR c: id da cor na PALETTE; WIDTH n: S<n>
+    program = array("l")
+    run_op = None  #opcode da sequência que está sendo dobrada
+    run = 0
+    color = None
+    size = largura
+    digits = None
+    for cmd in symbols:
+        if digits is not None:
+            if "0" <= cmd <= "9":
+                digits += cmd
+                continue
+            if digits and int(digits) != size:
+                if run_op is not None and (run_op != OP_TURN or run):
+                    program.extend((run_op, run))
+                run_op = None
+                size = int(digits)
+                program.extend((OP_WIDTH, size))
+            digits = None
+        if cmd in COLORS:
+            op = OP_MOVE
+            if COLORS[cmd] != color:
+                if run_op is not None and (run_op != OP_TURN or run):
+                    program.extend((run_op, run))
+                run_op = None
+                color = COLORS[cmd]
+                program.extend((OP_COLOR, color))
+        elif cmd == "f":
+            op = OP_JUMP
+        elif cmd == "+" or cmd == "-":
+            if run_op != OP_TURN:
+                if run_op is not None:
+                    program.extend((run_op, run))
+                run_op, run = OP_TURN, 0
+            run += 1 if cmd == "-" else -1
+            continue
+        elif cmd == "[" or cmd == "]":
+            if run_op is not None and (run_op != OP_TURN or run):
+                program.extend((run_op, run))
+            run_op = None
+            program.extend((OP_PUSH if cmd == "[" else OP_POP, 0))
+            continue
+        else:
+            if cmd == "S":
+                digits = ""
+            continue
+        if run_op == op:
+            run += 1
+        else:
+            if run_op is not None and (run_op != OP_TURN or run):
+                program.extend((run_op, run))
+            run_op, run = op, 1
+    if run_op is not None and (run_op != OP_TURN or run):
+        program.extend((run_op, run))
+    return program
+
+
+def save_segments(path, segments):
+    np.savez(path, **segments._asdict())
+
+
+def load_segments(path):
+    with np.load(path) as data:
+        return Segments(*(data[name] for name in Segments._fields))
@@ -1,5 +1,12 @@
-from typing import Dict, Set, List
+from typing import Dict, Set, List, Tuple, Optional
 from dataclasses import dataclass
+from itertools import product
+import os
+import sys
+
+# o índice das transições e o Rastro vêm do ex5.py, na raiz do repositório
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from ex5 import Rastro, indexar, primeira_valida, topos_possiveis
 
 class Estado:
   identificador: str
@@ -46,10 +53,7 @@ class LSystem:
     cadeia_atual = self.axioma
     
     for _ in range(iteracoes):
-      nova_cadeia = ""
-      for simbolo in cadeia_atual:
-          nova_cadeia += self.regras_producao.get(simbolo, simbolo)
-      cadeia_atual = nova_cadeia
+      cadeia_atual = "".join(self.regras_producao.get(simbolo, simbolo) for simbolo in cadeia_atual)
     return cadeia_atual
 
 @dataclass
@@ -59,27 +63,25 @@ class AutomatoPilha:
   alfabeto_pilha: Set[str]
   estado_inicial: str
   estado_final: str
+  rastro: Optional[Rastro] = None
 
   def validar_cadeia(self, cadeia: str, transicoes: List[Transicao]) -> bool:
     
+    estado_atual = self.estado_inicial
     pilha: List[str] = ['$']  # Símbolo inicial de pilha
+    indice = self.indexar_transicoes(transicoes)
      
-    for simbolo in cadeia:
-      # Encontra transições válidas
-      transicoes_validas = [
-        t for t in transicoes 
-          if (t.estado_origem == self.estado_inicial and t.simbolo_desempilhavel == '$') or
-                ((t.estado_origem == self.estado_final and 
-                t.simbolo_leitura == simbolo and 
-                (not t.simbolos_empilhar or
-                not pilha or 
-                t.simbolos_empilhar == pilha[-1])))
-      ]
-
-      if not transicoes_validas:
+    for passo, simbolo in enumerate(cadeia):
+      # Encontra a primeira transição válida no índice
+      chave = (simbolo, pilha[-1] if pilha else None)
+      if chave not in indice:  # símbolo fora do alfabeto
+        indice[chave] = primeira_valida(transicoes, self._valida, chave)
+      transicao = indice[chave]
+      if self.rastro is not None:
+        self.rastro.passo(passo, estado_atual, simbolo, transicao, pilha)
+
+      if transicao is None:
         return False
-
-      transicao = transicoes_validas[0]
       
       # Aplica a transição
       pilha = transicao.aplicar(pilha)
@@ -89,6 +91,17 @@ class AutomatoPilha:
 
 
 
+  def _valida(self, t: Transicao, simbolo: str, topo: Optional[str]) -> bool:
+    # topo None = pilha vazia
+    return ((t.estado_origem == self.estado_inicial and t.simbolo_desempilhavel == '$') or
+            (t.estado_origem == self.estado_final and
+             t.simbolo_leitura == simbolo and
+             (not t.simbolos_empilhar or topo is None or t.simbolos_empilhar == topo)))
+
+  def indexar_transicoes(self, transicoes: List[Transicao]) -> Dict[Tuple[str, Optional[str]], Optional[Transicao]]:
+    simbolos = {t.simbolo_leitura for t in transicoes}
+    return indexar(transicoes, self._valida, product(simbolos, topos_possiveis(transicoes)))
+
   def construir_transicoes(self, n: int) -> List[Transicao]:
     transicoes = []
     
@@ -117,21 +130,21 @@ class AutomatoPilha:
     #talvez nao precise dessa
     transicoes.append(Transicao(self.estado_final, self.estado_final, '', '$', []))
             
-    print(transicoes)
+    if self.rastro is not None:
+      self.rastro.evento(f"{len(transicoes)} transições: {transicoes}")
 
     return transicoes
 
-def debug_validacao(cadeia: str, automato: AutomatoPilha, transicoes: List[Transicao]):
+def debug_validacao(cadeia: str, automato: AutomatoPilha, transicoes: List[Transicao], rastro: Optional[Rastro] = None):
+  # validação passo a passo pelo rastro; por padrão mostra cada passo na tela
+  if rastro is None:
+    rastro = Rastro(saida=print)
   estado_atual = automato.estado_inicial
   pilha: List[str] = ['$']  # Símbolo inicial de pilha
   
-  print(f"Iniciando validação da cadeia: {cadeia}")
-  print(f"Estado inicial: {estado_atual}")
-  print(f"Pilha inicial: {pilha}")
+  rastro.evento(f"Iniciando validação da cadeia ({len(cadeia)} símbolos) no estado {estado_atual}")
   
   for i, simbolo in enumerate(cadeia):
-    print(f"\nProcessando símbolo {i}: {simbolo}")
-    
     # Encontra transições válidas
     transicoes_validas = [
         t for t in transicoes 
@@ -140,38 +153,21 @@ def debug_validacao(cadeia: str, automato: AutomatoPilha, transicoes: List[Trans
             (not pilha or t.simbolo_desempilhavel == pilha[-1]))
     ]
     
-    print(f"Transições válidas encontradas: {len(transicoes_validas)}")
-    
-    if not transicoes_validas:
-      print(f"Nenhuma transição válida encontrada para o símbolo {simbolo}")
-      print(f"Estado atual: {estado_atual}")
-      print(f"Pilha atual: {pilha}")
-      return False
-    
     # Escolhe a primeira transição válida
-    transicao = transicoes_validas[0]
+    transicao = transicoes_validas[0] if transicoes_validas else None
+    rastro.passo(i, estado_atual, simbolo, transicao, pilha)
     
-    print(f"Transição escolhida:")
-    print(f"  Origem: {transicao.estado_origem.identificador}")
-    print(f"  Destino: {transicao.estado_destino.identificador}")
-    print(f"  Símbolo de leitura: {transicao.simbolo_leitura}")
-    print(f"  Símbolo desempilhavel: {transicao.simbolo_desempilhavel}")
-    print(f"  Símbolos a empilhar: {transicao.simbolos_empilhar}")
+    if transicao is None:
+      return False
     
     # Aplica a transição
-    pilha = transicao.aplicar(pilha.copy())
+    pilha = transicao.aplicar(pilha)
     estado_atual = transicao.estado_destino
-    
-    print(f"Pilha após transição: {pilha}")
-    print(f"Estado atual: {estado_atual.identificador}")
  
   # Verifica se chegou ao estado final com pilha vazia
   resultado_final = estado_atual == automato.estado_final and pilha == ['$']
   
-  print("\nValidação concluída:")
-  print(f"Estado final: {estado_atual.identificador}")
-  print(f"Pilha final: {pilha}")
-  print(f"Resultado: {resultado_final}")
+  rastro.evento(f"Validação concluída: estado {estado_atual}, pilha {pilha}, resultado {resultado_final}")
   
   return resultado_final
 
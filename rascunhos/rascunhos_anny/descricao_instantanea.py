@@ -1,3 +1,6 @@
+from collections import deque
+
+
 class PDAutomataSnapshot:
     def __init__(self, state, input_remaining, stack):
         """
@@ -91,6 +94,238 @@ class TransitionRule:
         self.next_state = next_state
         self.push_symbols = push_symbols
 
+class StackNode:
+    __slots__ = ('symbol', 'below', 'depth')
+
+    def __init__(self, symbol, below):
+        """
+        Nó de uma pilha persistente (lista ligada): empilhar cria um nó novo
+        que aponta para a pilha de baixo, que continua valendo para as outras
+        configurações que a compartilham
+        """
+        self.symbol = symbol
+        self.below = below
+        self.depth = 1 if below is None else below.depth + 1
+
+    def __iter__(self):
+        """
+        Símbolos do topo para a base
+        """
+        node = self
+        while node is not None:
+            yield node.symbol
+            node = node.below
+
+
+BOTTOM = object()  # fundo da pilha nas buscas por resumos: nenhuma regra o desempilha
+
+
+class PDASearch:
+    def __init__(self, transition_rules, final_states, stack_window=None, max_stack=None):
+        """
+        Simulação não determinística de um Autômato de Pilha sem copiar pilhas
+        nem fatiar a entrada.
+
+        Por padrão a busca é por resumos: um contexto (estado, posição, topo)
+        guarda aonde se chega desempilhando aquele topo (estado, posição), e
+        isso vale para qualquer pilha embaixo dele. Como há no máximo
+        |estados| * (|entrada| + 1) * |símbolos| contextos, o custo é
+        polinomial no tamanho da entrada e ciclos ε que só empilham terminam.
+
+        Com stack_window ou max_stack a busca é explícita: cada configuração é
+        (estado, posição na entrada, nó do topo da pilha), com as pilhas em
+        listas ligadas de nós únicos para cada (símbolo, pilha de baixo), então
+        duas pilhas iguais são o mesmo objeto e uma configuração já vista é
+        descartada em O(1). Aí não há limite polinomial: o número de pilhas
+        diferentes pode ser exponencial
+
+        :param transition_rules: Regras de transição (TransitionRule); 'ε' na
+            entrada não consome símbolo, 'ε' no topo não desempilha e ['ε'] não empilha nada
+        :param final_states: Conjunto de estados finais
+        :param stack_window: Se dado, configurações com o mesmo estado, a mesma
+            posição e os mesmos stack_window símbolos do topo contam como iguais
+            (mais rápido, mas pode descartar caminhos que só diferem mais fundo na pilha)
+        :param max_stack: Altura máxima da pilha explorada na busca explícita
+            (corta ciclos ε que só empilham)
+        """
+        self.rules_by_state = {}
+        for rule in transition_rules:
+            self.rules_by_state.setdefault(rule.current_state, []).append(rule)
+        self.final_states = final_states
+        self.stack_window = stack_window
+        self.max_stack = max_stack
+        self.nodes = {}
+        self.explored = 0
+
+    def push(self, symbol, below):
+        """
+        Empilha symbol sobre below, reaproveitando o nó se já existir
+        """
+        key = (symbol, id(below))
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = StackNode(symbol, below)
+        return node
+
+    def make_stack(self, symbols):
+        """
+        Pilha persistente a partir de uma lista (o último elemento é o topo)
+        """
+        stack = None
+        for symbol in symbols:
+            stack = self.push(symbol, stack)
+        return stack
+
+    def key(self, state, position, stack):
+        if self.stack_window is None:
+            return state, position, id(stack)
+        top = []
+        node = stack
+        while node is not None and len(top) < self.stack_window:
+            top.append(node.symbol)
+            node = node.below
+        return state, position, tuple(top)
+
+    def successors(self, state, position, stack, input_symbols):
+        """
+        Configurações alcançáveis com uma transição
+        """
+        for rule in self.rules_by_state.get(state, ()):
+            next_position = position
+            if rule.input_symbol != 'ε':
+                if position == len(input_symbols) or input_symbols[position] != rule.input_symbol:
+                    continue
+                next_position += 1
+            next_stack = stack
+            if rule.stack_top != 'ε':
+                if stack is None or stack.symbol != rule.stack_top:
+                    continue
+                next_stack = stack.below
+            if rule.push_symbols != ['ε']:
+                for symbol in reversed(rule.push_symbols):
+                    next_stack = self.push(symbol, next_stack)
+            yield rule.next_state, next_position, next_stack
+
+    def accepts(self, input_symbols, state, stack):
+        """
+        Procura, a partir de (state, início da entrada, stack), uma
+        configuração num estado final com a entrada toda lida
+
+        :param input_symbols: Cadeia (ou lista de símbolos) de entrada
+        :param state: Estado inicial
+        :param stack: Pilha inicial (lista, o último elemento é o topo)
+        :return: True se alguma configuração chega a um estado final com a entrada toda lida
+        """
+        if self.stack_window is None and self.max_stack is None:
+            return self.accepts_summaries(input_symbols, state, stack)
+        # os nós só valem durante uma busca: sem isso um PDASearch usado muitas
+        # vezes guardaria todas as pilhas que já montou
+        self.nodes = {}
+        try:
+            return self.accepts_explicit(input_symbols, state, stack)
+        finally:
+            self.nodes = {}
+
+    def accepts_explicit(self, input_symbols, state, stack):
+        """
+        Busca em largura pelas configurações, cada uma visitada uma vez só
+        """
+        start = (state, 0, self.make_stack(stack))
+        visited = {self.key(*start)}
+        frontier = deque([start])
+        self.explored = 0
+        while frontier:
+            state, position, stack = frontier.popleft()
+            self.explored += 1
+            if state in self.final_states and position == len(input_symbols):
+                return True
+            for successor in self.successors(state, position, stack, input_symbols):
+                if self.max_stack is not None and successor[2] is not None and successor[2].depth > self.max_stack:
+                    continue
+                key = self.key(*successor)
+                if key not in visited:
+                    visited.add(key)
+                    frontier.append(successor)
+        return False
+
+    def accepts_summaries(self, input_symbols, state, stack):
+        """
+        Busca por resumos: cada configuração local (contexto, estado, posição,
+        topo) é vista uma vez, com o topo na mesma altura do topo que abriu o
+        contexto. Empilhar abre (ou reaproveita) o contexto do novo topo e
+        guarda o que fica embaixo como continuação; desempilhar abaixo da
+        altura do contexto vira um resumo (estado, posição) dele, que continua
+        em cada continuação já registrada ou que ainda for registrada
+        """
+        size = len(input_symbols)
+        summaries = {}  # contexto -> {(estado, posição)}
+        continuations = {}  # contexto -> {(contexto de baixo, símbolos de baixo)}
+        seen = set()
+        pending = deque()
+        self.explored = 0
+
+        def local(context, state, position, top):
+            item = (context, state, position, top)
+            if item not in seen:
+                seen.add(item)
+                pending.append(item)
+
+        def replace(context, state, position, symbols):
+            # o topo do contexto vira symbols (o primeiro fica no topo)
+            if not symbols:
+                returned(context, state, position)
+            elif len(symbols) == 1:
+                local(context, state, position, symbols[0])
+            else:
+                enter((state, position, symbols[0]), context, symbols[1:])
+
+        def enter(context, below, rest):
+            if context not in continuations:
+                continuations[context] = set()
+                summaries[context] = set()
+                local(context, *context)
+            if (below, rest) not in continuations[context]:
+                continuations[context].add((below, rest))
+                for state, position in list(summaries[context]):
+                    replace(below, state, position, rest)
+
+        def returned(context, state, position):
+            if (state, position) not in summaries[context]:
+                summaries[context].add((state, position))
+                for below, rest in list(continuations[context]):
+                    replace(below, state, position, rest)
+
+        # a pilha inicial fica sobre o BOTTOM, que é o topo do contexto raiz
+        root = (None, 0, BOTTOM)
+        continuations[root] = set()
+        summaries[root] = set()
+        replace(root, state, 0, tuple(reversed(stack)) + (BOTTOM,))
+        while pending:
+            context, state, position, top = pending.popleft()
+            self.explored += 1
+            if state in self.final_states and position == size:
+                return True
+            for rule in self.rules_by_state.get(state, ()):
+                next_position = position
+                if rule.input_symbol != 'ε':
+                    if position == size or input_symbols[position] != rule.input_symbol:
+                        continue
+                    next_position += 1
+                pushed = () if rule.push_symbols == ['ε'] else tuple(rule.push_symbols)
+                if rule.stack_top == 'ε':
+                    pushed += (top,)
+                elif top is BOTTOM or top != rule.stack_top:
+                    continue
+                replace(context, rule.next_state, next_position, pushed)
+        return False
+
+    def snapshot(self, state, position, stack, input_symbols):
+        """
+        Configuração como PDAutomataSnapshot (para imprimir)
+        """
+        return PDAutomataSnapshot(state, list(input_symbols[position:]),
+                                  list(reversed(list(stack or ()))))
+
 # Exemplo de uso
 def example_usage():
     # Definir regras de transição para reconhecer palíndromos
@@ -133,6 +368,11 @@ def example_usage():
             for snapshot in current_snapshots:
                 print(snapshot)
 
+    # Mesma busca sem cópias e sem repetir configurações
+    search = PDASearch(transition_rules, {'q2'})
+    accepted = search.accepts(['0', '1', '1', '0'], 'q0', ['Z'])
+    print(f"\nAceita: {accepted} ({search.explored} configurações exploradas)")
+
 # Executar exemplo
 if __name__ == '__main__':
     example_usage()
\ No newline at end of file
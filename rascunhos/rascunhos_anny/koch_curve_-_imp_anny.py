@@ -51,10 +51,15 @@ class Lsystem:
     self.cadeia_obtida = cadeia_obtida
     
 
-  def desenhar(self):
-    for simbolo in self.cadeia_obtida:
+  def desenhar(self, lote=1000):
+    # sem animação: a tela só é redesenhada a cada `lote` símbolos
+    turtle.tracer(0)
+    for i, simbolo in enumerate(self.cadeia_obtida, 1):
       self.alfabeto.executar_turtle(simbolo, self.turtle)
-      turtle.update()  # Atualiza o desenho
+      if i % lote == 0:
+        turtle.update()  # Atualiza o desenho
+        self.screen.title(f"Curva de Koch {100 * i // len(self.cadeia_obtida)}%")
+    turtle.update()
 
     turtle.done()
 
@@ -39,10 +39,7 @@ class LSystem:
     cadeia_atual = self.axioma
     
     for _ in range(iteracoes):
-      nova_cadeia = ""
-      for simbolo in cadeia_atual:
-          nova_cadeia += self.regras_producao.get(simbolo, simbolo)
-      cadeia_atual = nova_cadeia
+      cadeia_atual = "".join(self.regras_producao.get(simbolo, simbolo) for simbolo in cadeia_atual)
     return cadeia_atual
 
 @dataclass
@@ -0,0 +1,56 @@
+# o AutomatoNiveis tem que aceitar exatamente as mesmas cadeias que o
+# AutomatoPilha, e o AutomatoPilha o mesmo com a PilhaCompacta e com uma lista
+# comum: confere em derivações válidas, truncadas, de outro nível e com um
+# símbolo trocado, apagado ou inserido
+import random
+
+from ex5 import AutomatoNiveis, AutomatoPilha, LSystem
+
+SYSTEMS = [
+    ({"F": "variavel", "+": "constante", "-": "constante"}, "F", {"F": "F+F-F-F+F"}),
+    ({"F": "variavel", "[": "constante", "]": "constante", "+": "constante", "-": "constante"},
+     "F", {"F": "F[+F][-F]"}),
+    ({"X": "variavel", "F": "variavel", "[": "constante", "]": "constante",
+      "+": "constante", "-": "constante"}, "X", {"X": "F[+X]F[-X]+X", "F": "FF"}),
+    ({"A": "variavel", "B": "variavel"}, "AB", {"A": "AB", "B": "A"}),
+    ({"F": "variavel", "X": "variavel", "+": "constante"}, "FX", {"X": "", "F": "F+F"}),  #produção vazia
+]
+
+
+def cadeias(l_system, niveis, rng):
+    simbolos = list(l_system.alfabeto) + ["?"]
+    for nivel in range(niveis + 2):
+        cadeia = l_system.gerar_cadeia(nivel)
+        yield cadeia
+        for corte in {0, 1, len(cadeia) // 2, len(cadeia) - 1}:
+            yield cadeia[:max(corte, 0)]
+        for _ in range(10):
+            i = rng.randrange(len(cadeia) + 1)
+            yield cadeia[:i] + rng.choice(simbolos) + cadeia[i + 1:]
+            yield cadeia[:i] + rng.choice(simbolos) + cadeia[i:]
+            yield cadeia[:i] + cadeia[i + 1:]
+
+
+def test_validadores_aceitam_o_mesmo():
+    rng = random.Random(0)
+    for alfabeto, axioma, regras in SYSTEMS:
+        l_system = LSystem(alfabeto=alfabeto, axioma=axioma, regras_producao=regras)
+        niveis = AutomatoNiveis(l_system)
+        for n in range(4):
+            automato = AutomatoPilha(l_system, set(), "q0", "q1", "q2", n)
+            transicoes = automato.construir_transicoes()
+            aceitas = 0
+            for cadeia in cadeias(l_system, n, rng):
+                esperado = niveis.validar_cadeia(cadeia, n)
+                automato.pilha_compacta = True
+                assert automato.validar_cadeia(cadeia, transicoes) == esperado, (regras, n, cadeia)
+                automato.pilha_compacta = False
+                assert automato.validar_cadeia(cadeia, transicoes) == esperado, (regras, n, cadeia)
+                aceitas += esperado
+            assert niveis.validar_cadeia(l_system.gerar_cadeia(n), n), (regras, n)
+            assert aceitas, (regras, n)
+
+
+if __name__ == "__main__":
+    test_validadores_aceitam_o_mesmo()
+    print("ok")
@@ -0,0 +1,37 @@
+# os motores do generate (translate, numpy e o paralelo com memória
+# compartilhada) têm que dar exatamente a mesma cadeia que o join, que
+# reescreve símbolo a símbolo. O paralelo roda com o limite zerado para que
+# até as cadeias pequenas passem pelos pedaços nos processos
+from ex1 import LSystem, np, parse_rules
+
+SYSTEMS = [
+    ("F", "F:F[+F][-F]", 6),
+    ("FGRBO", "F:F[-G][+G],G:F[-R][+R],R:F[-B][+B],B:F[-O][+O],O:F[-F][+F]", 5),
+    ("F--F--F", "F:F+F--F+F", 5),
+    ("X", "X:F[+X]F[-X]+X,F:FF", 6),
+    ("AB", "A:AB,B:A", 12),
+    ("F", "F:F+S3F-S12F", 5),
+    ("FX", "X:,F:F+F", 7),  #produção vazia
+    ("ab", "ab:ba,a:aa", 4),  #regra de mais de um caractere: sempre join
+]
+
+
+def generate(axiom, rules, iterations, engine, workers=1):
+    lsys = LSystem(axiom, parse_rules(rules), 60, 10, 1)
+    lsys.parallel_min_len = 0
+    lsys.generate(iterations, engine, workers)
+    return lsys.result
+
+
+def test_engines_match_join():
+    for axiom, rules, iterations in SYSTEMS:
+        expected = generate(axiom, rules, iterations, "join")
+        assert generate(axiom, rules, iterations, "translate") == expected, rules
+        assert generate(axiom, rules, iterations, "translate", workers=3) == expected, rules
+        if np is not None:
+            assert generate(axiom, rules, iterations, "numpy") == expected, rules
+
+
+if __name__ == "__main__":
+    test_engines_match_join()
+    print("ok")